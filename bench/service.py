@@ -0,0 +1,75 @@
+#
+# bench/service.py
+#
+# Throughput and latency of the local query service.
+#
+#     python3 bench/service.py [--requests 200] [--batch 100]
+#
+# Starts the service in-process on a free port, then sends batches of
+# random window queries over HTTP. The first pass is all cache misses;
+# the second repeats the same batches and is served from the cache.
+#
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+
+import numpy as np
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+
+import load
+import service
+
+
+def batches( cube, requests, size, seed = 512 ):
+    rng = np.random.default_rng( seed )
+    keys = np.asarray( cube.keys, dtype = object )[ rng.integers( 0, len( cube.keys ), ( requests, size ) ) ]
+    dates = np.asarray( cube.dates, dtype = object )[ rng.integers( 60, len( cube.dates ) - 30, ( requests, size ) ) ]
+    return( [ [ { 'county': k, 'date': d } for k, d in zip( keys[ r ], dates[ r ] ) ] for r in range( requests ) ] )
+
+
+def send( url, queries ):
+    request = urllib.request.Request( url, data = json.dumps( { 'queries': queries } ).encode( 'utf-8' ),
+                                      headers = { 'Content-Type': 'application/json' } )
+    start = time.perf_counter()
+    with urllib.request.urlopen( request ) as response:
+        json.load( response )
+    return( time.perf_counter() - start )
+
+
+def report( name, latencies, size ):
+    latencies = sorted( latencies )
+    total = sum( latencies )
+    print( "{0:<8} {1:>10.0f} {2:>10.2f} {3:>10.2f}".format(
+        name, len( latencies ) * size / total, 1000 * statistics.median( latencies ),
+        1000 * latencies[ int( 0.99 * ( len( latencies ) - 1 ) ) ] ) )
+
+
+def main( argv = None ):
+    parser = argparse.ArgumentParser( description = "Throughput and latency of the local query service." )
+    parser.add_argument( '--requests', type = int, default = 200 )
+    parser.add_argument( '--batch', type = int, default = 100 )
+    args = parser.parse_args( argv )
+
+    cube = load.load_cube()
+    server = service.make_server( cube, port = 0 )
+    threading.Thread( target = server.serve_forever, daemon = True ).start()
+    url = "http://{0}:{1}/query".format( *server.server_address )
+
+    work = batches( cube, args.requests, args.batch )
+    print( "{0:<8} {1:>10} {2:>10} {3:>10}".format( 'pass', 'queries/s', 'p50 (ms)', 'p99 (ms)' ) )
+    report( 'cold', [ send( url, queries ) for queries in work ], args.batch )
+    report( 'cached', [ send( url, queries ) for queries in work ], args.batch )
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
+
+
+# --- END --- #
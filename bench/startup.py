@@ -0,0 +1,66 @@
+#
+# bench/startup.py
+#
+# Cold-start time of a compute-only run, and a check of which heavy
+# libraries it pulls in. The plotting and geospatial stacks should never
+# appear. scipy does, for the exact rate ratios. pyarrow is loaded by
+# pandas itself when installed, and by the results store otherwise.
+#
+#     python3 bench/startup.py [--repeat N]
+#
+# Each sample is a fresh interpreter, so imports are paid every time.
+#
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+
+HEAVY_MODULES = [ 'matplotlib', 'geopandas', 'shapely', 'descartes', 'geocoder', 'scipy', 'pyarrow' ]
+
+CASES = {
+    'import pipeline': "import pipeline",
+    'compute-only run': "import pipeline; pipeline.main( [ '--compute-only', '--no-write' ] )",
+}
+
+CHECK = "import sys; {0}; print( ' '.join( m for m in {1!r} if m in sys.modules ) )"
+
+
+def sample( code ):
+    env = dict( os.environ )
+    env.pop( 'BING_API_KEY', None )
+    start = time.perf_counter()
+    subprocess.run( [ sys.executable, '-c', code ], cwd = ROOT, env = env, check = True,
+                    stdout = subprocess.DEVNULL )
+    return( time.perf_counter() - start )
+
+
+def heavy_imports( code ):
+    env = dict( os.environ )
+    env.pop( 'BING_API_KEY', None )
+    result = subprocess.run( [ sys.executable, '-c', CHECK.format( code, HEAVY_MODULES ) ], cwd = ROOT,
+                             env = env, check = True, capture_output = True, text = True )
+    return( result.stdout.split() )
+
+
+def main( argv = None ):
+    parser = argparse.ArgumentParser( description = "Cold-start time of a compute-only run." )
+    parser.add_argument( '--repeat', type = int, default = 5 )
+    args = parser.parse_args( argv )
+
+    print( "{0:<20} {1:>10} {2:>10}  {3}".format( 'case', 'min (s)', 'median (s)', 'heavy imports' ) )
+    for name, code in CASES.items():
+        times = [ sample( code ) for _ in range( args.repeat ) ]
+        heavy = heavy_imports( code )
+        print( "{0:<20} {1:>10.3f} {2:>10.3f}  {3}".format( name, min( times ), statistics.median( times ),
+                                                           ' '.join( heavy ) or 'none' ) )
+
+
+if __name__ == '__main__':
+    main()
+
+
+# --- END --- #
@@ -0,0 +1,88 @@
+#
+# Equivalence of the vectorized outcome module with the notebook's
+# row-wise percent_change and rally_colors.
+#
+# Run from the repository root:
+#
+#     python3 -m pytest code/test/test-outcome.py
+#
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert( 0, os.path.join( os.path.dirname( __file__ ), '..', '..' ) )
+
+import constants
+import outcome
+
+
+# The notebook's functions, verbatim.
+def percent_change( row ):
+    deaths_prior = row[ "deaths_prior" ]
+    deaths_after = row[ "deaths_after" ]
+
+    if ( (deaths_prior) == (deaths_after) ):
+        return( 0 )
+
+    if ( deaths_prior < deaths_after ):
+        change = ( deaths_after - deaths_prior ) / ( 1 if deaths_prior == 0 else deaths_prior )
+    else:
+        change = (-1) * ( deaths_prior - deaths_after ) / ( 1 if deaths_prior == 0 else deaths_prior )
+
+    return( round( change * 100, 2 ) )
+
+
+def rally_colors( row ):
+    if row[ "percent_change" ] < 0:
+        return( "green" )
+    elif row[ "percent_change" ] > 0:
+        return( "red" )
+    elif row[ "percent_change" ] == 0:
+        return( "blue" )
+
+
+def test_published_percent_change():
+    augmented = pd.read_csv( constants.AUGMENTED_FILE )
+    change = outcome.percent_change( augmented[ "deaths_prior" ], augmented[ "deaths_after" ] )
+    assert ( change == augmented[ "percent_change" ].to_numpy() ).all()
+
+
+def test_published_colors():
+    time_series = pd.read_csv( constants.TIME_SERIES_FILE )
+    assert list( outcome.colors( time_series[ "percent_change" ] ) ) == list( time_series[ "mark_color" ] )
+
+
+def test_matches_row_functions():
+    rng = np.random.default_rng( 512 )
+    n = 200000
+    counts = pd.DataFrame( {
+        "deaths_prior": rng.integers( 0, 40, n ).astype( float ),
+        "deaths_after": rng.integers( 0, 40, n ).astype( float ),
+    } )
+    counts.iloc[ :1000, 1 ] = counts.iloc[ :1000, 0 ]
+    counts.iloc[ 1000:1010, 0 ] = np.nan
+
+    expected = counts.apply( percent_change, axis = 1 ).to_numpy()
+    change = outcome.percent_change( counts[ "deaths_prior" ], counts[ "deaths_after" ] )
+    np.testing.assert_array_equal( change, expected )
+
+    colors = pd.DataFrame( { "percent_change": expected } ).apply( rally_colors, axis = 1 )
+    assert list( pd.Series( outcome.colors( change ) ).fillna( 'none' ) ) == list( colors.fillna( 'none' ) )
+
+
+def test_classes():
+    kinds = outcome.classify( [ 12.5, -3.0, 0.0, np.nan ] )
+    assert list( kinds ) == [ outcome.INCREASE, outcome.DECREASE, outcome.NO_CHANGE, None ]
+
+
+if __name__ == '__main__':
+    test_published_percent_change()
+    test_published_colors()
+    test_matches_row_functions()
+    test_classes()
+    print( "ok" )
+
+
+# --- END --- #
@@ -0,0 +1,59 @@
+#
+# Equivalence of the out-of-core cube with the in-memory path, at a
+# budget small enough to force many row and column blocks.
+#
+# Run from the repository root:
+#
+#     python3 -m pytest code/test/test-outofcore.py
+#
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert( 0, os.path.join( os.path.dirname( __file__ ), '..', '..' ) )
+
+import constants
+import load
+import outofcore
+import transform
+import window
+
+BUDGET = 64 * 1024
+
+FILES = { 'deaths': constants.METRIC_FILES[ 'deaths' ] }
+
+
+def test_cube_matches( tmp_path ):
+    expected = load.load_cube( FILES )
+    cube = outofcore.build_cube( FILES, str( tmp_path ), BUDGET )
+    assert isinstance( cube.values, np.memmap )
+    np.testing.assert_array_equal( cube.values, expected.values )
+    assert list( cube.keys ) == list( expected.keys )
+    assert list( cube.dates ) == list( expected.dates )
+    assert cube.metrics == expected.metrics
+    pd.testing.assert_frame_equal( cube.meta, expected.meta, check_dtype = False )
+
+
+def test_windows_match( tmp_path ):
+    expected = load.load_cube( FILES )
+    cube = outofcore.build_cube( FILES, str( tmp_path / 'cube' ), BUDGET )
+    events = pd.read_csv( constants.AUGMENTED_FILE )[ [ 'Combined_Key', 'Date' ] ]
+    pd.testing.assert_frame_equal( outofcore.rally_windows( cube, events, budget = 2000 ),
+                                   window.rally_windows( expected, events ) )
+
+    daily = outofcore.map_blocks( cube, transform.daily, str( tmp_path / 'daily' ), BUDGET )
+    np.testing.assert_array_equal( daily.values, transform.daily( expected.values ) )
+
+
+if __name__ == '__main__':
+    import tempfile
+    import pathlib
+
+    test_cube_matches( pathlib.Path( tempfile.mkdtemp() ) )
+    test_windows_match( pathlib.Path( tempfile.mkdtemp() ) )
+    print( "ok" )
+
+
+# --- END --- #
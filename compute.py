@@ -0,0 +1,45 @@
+#
+# compute.py
+#
+# Numbers only: window sums, percent change and the output tables. Nothing
+# here imports the plotting or geospatial stacks.
+#
+import pandas as pd
+
+import constants
+import outcome
+import rates
+import window
+
+AUGMENTED_COLUMNS = [ 'Date', 'City', 'State', 'County', 'Combined_Key', 'FIPS', 'Lat', 'Long_', 'Population' ]
+
+
+def augment( cube, rallies, interval = constants.TIME_INTERVAL ):
+    """Resolved rallies joined with county metadata, window sums, percent_change
+    and the Poisson rate ratio of after vs prior."""
+    augmented = rallies.join( cube.meta[ [ 'FIPS', 'Lat', 'Long_', 'Population' ] ], on = 'Combined_Key' )
+    augmented = augmented.reindex( columns = AUGMENTED_COLUMNS )
+    augmented = pd.concat( [ augmented, window.rally_windows( cube, augmented, interval ) ], axis = 1 )
+    augmented[ "percent_change" ] = outcome.percent_change( augmented[ "deaths_prior" ], augmented[ "deaths_after" ] )
+    prior_days, after_days = window.window_days( cube, augmented, interval )
+    augmented = augmented.join( rates.rate_ratio( augmented[ "deaths_prior" ], augmented[ "deaths_after" ],
+                                                  prior_days, after_days, index = augmented.index ) )
+    return( augmented )
+
+
+def locations( augmented ):
+    """City, position and percent_change, with the point as WKT."""
+    locations = augmented[ [ 'City', 'Lat', 'Long_', 'percent_change' ] ].copy()
+    locations[ 'geometry' ] = [ "POINT ({0:.16g} {1:.16g})".format( x, y )
+                                for x, y in zip( locations[ 'Long_' ], locations[ 'Lat' ] ) ]
+    return( locations )
+
+
+def time_series( augmented ):
+    columns = [ 'Date', 'City', 'State', 'County', 'Combined_Key', 'percent_change' ]
+    time_series = augmented[ columns ].copy()
+    time_series[ "mark_color" ] = outcome.colors( time_series[ "percent_change" ] )
+    return( time_series )
+
+
+# --- END --- #
@@ -1,9 +1,49 @@
-
 #
 # constants.py
 #
 TIME_INTERVAL = 42
 
+#
+# JHU CSSE time series files, one per metric. Only the deaths file is
+# checked in; the others are loaded when present.
+#
+METRIC_FILES = {
+    'deaths': 'data/time_series_covid19_deaths_US.csv',
+    'confirmed': 'data/time_series_covid19_confirmed_US.csv',
+}
 
-# --- END --- #
+GLOBAL_METRIC_FILES = {
+    'deaths': 'data/time_series_covid19_deaths_global.csv',
+    'confirmed': 'data/time_series_covid19_confirmed_global.csv',
+}
+
+CUBE_DIR = 'data/cube'
+
+# Peak memory, in bytes, that out-of-core processing aims to stay under.
+MEMORY_BUDGET = 256 * 1024 * 1024
+
+RALLIES_FILE = 'data/trump-rallies.csv'
+STATE_ABBR_FILE = 'data/state-abbr.csv'
+STATE_SHAPES_FILE = 'data/tl_2019_us_state/tl_2019_us_state.shp'
 
+#
+# Pipeline outputs. The results store is the record of every run; the
+# three CSVs are projections of its latest baseline run. The augmented
+# file doubles as the geocoding cache, so a rerun only calls Bing for
+# places it has not seen.
+#
+AUGMENTED_FILE = 'data/trump-rallies-augmented.csv'
+LOCATIONS_FILE = 'data/trump-rally-locations.csv'
+TIME_SERIES_FILE = 'data/trump-rallies-times-series.csv'
+RESULTS_STORE = 'data/results'
+
+HISTOGRAM_PLOT = 'viz/hist-counties-by-percent-change.png'
+MAP_PLOT = 'viz/geo-rallies-and-impact.png'
+TIME_SERIES_PLOT = 'viz/trump-rallies-time-series.png'
+
+# Above this many points the map and time-series plots are binned into a
+# grid instead of drawing one marker per event.
+RASTER_THRESHOLD = 5000
+
+
+# --- END --- #
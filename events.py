@@ -0,0 +1,134 @@
+#
+# events.py
+#
+# The rally before/after analysis for any list of dated events: protests,
+# games, school openings. An events frame needs a `Date` column and one
+# way of locating each event:
+#
+#   Combined_Key      the JHU key, e.g. "Tulsa, Oklahoma, US"
+#   FIPS              county FIPS code, as a number or a zero-padded string
+#   Lat and Long_     the nearest county centroid in the JHU file is used
+#   City and State    geocoded through resolve.py, as for the rallies
+#
+# Events are processed in chunks of `chunk_size` rows, so memory stays
+# bounded however long the list is.
+#
+import numpy as np
+import pandas as pd
+
+import constants
+import outcome
+import resolve
+import window
+
+CHUNK_SIZE = 100000
+
+# Rows of centroid distances computed at once when matching by position.
+NEAREST_CHUNK_SIZE = 1024
+
+EARTH_RADIUS = 6371.0  # km
+
+
+def fips_keys( cube, fips ):
+    """Combined_Key for each FIPS code, NaN when the code is not in the cube."""
+    known = cube.meta[ 'FIPS' ].dropna()
+    by_fips = pd.Series( known.index, index = known.astype( 'int64' ).values )
+    by_fips = by_fips[ ~by_fips.index.duplicated() ]
+    codes = pd.to_numeric( pd.Series( fips ), errors = 'coerce' )
+    return( codes.map( by_fips ).values )
+
+
+def nearest_keys( cube, lat, long, chunk_size = NEAREST_CHUNK_SIZE ):
+    """Combined_Key of the county centroid nearest to each position.
+
+    Distances use an equirectangular projection, which is plenty to pick
+    a county. Counties without coordinates, such as "Unassigned", are
+    never chosen; positions that are NaN get NaN.
+    """
+    centroids = cube.meta[ [ 'Lat', 'Long_' ] ].dropna()
+    centroids = centroids[ ( centroids[ 'Lat' ] != 0 ) | ( centroids[ 'Long_' ] != 0 ) ]
+    c_lat = np.radians( centroids[ 'Lat' ].to_numpy() )
+    c_long = np.radians( centroids[ 'Long_' ].to_numpy() )
+
+    lat = np.radians( np.asarray( lat, dtype = float ) )
+    long = np.radians( np.asarray( long, dtype = float ) )
+    nearest = np.empty( len( lat ), dtype = np.intp )
+    for start in range( 0, len( lat ), chunk_size ):
+        stop = start + chunk_size
+        dx = ( long[ start:stop, np.newaxis ] - c_long ) * np.cos( ( lat[ start:stop, np.newaxis ] + c_lat ) / 2 )
+        dy = lat[ start:stop, np.newaxis ] - c_lat
+        nearest[ start:stop ] = np.argmin( dx * dx + dy * dy, axis = 1 )
+
+    keys = centroids.index.to_numpy()[ nearest ].astype( object )
+    keys[ np.isnan( lat ) | np.isnan( long ) ] = np.nan
+    return( keys )
+
+
+def within_radius( cube, keys, radius, chunk_size = NEAREST_CHUNK_SIZE ):
+    """( event, county row ) pairs for every county whose centroid lies
+    within `radius` km of the event county's centroid.
+
+    Radius 0 pairs each event with its own county only, as does any event
+    whose county has no coordinates. Events not in the cube get no pairs.
+    """
+    rows = cube.keys.get_indexer( keys )
+    matched = np.flatnonzero( rows >= 0 )
+    if radius <= 0:
+        return( matched, rows[ matched ] )
+
+    lat = np.radians( cube.meta[ 'Lat' ].to_numpy( dtype = float ) )
+    long = np.radians( cube.meta[ 'Long_' ].to_numpy( dtype = float ) )
+    placed = np.isfinite( lat ) & np.isfinite( long ) & ( ( lat != 0 ) | ( long != 0 ) )
+
+    events_out, rows_out = [], []
+    for start in range( 0, len( matched ), chunk_size ):
+        chunk = matched[ start:start + chunk_size ]
+        origin = rows[ chunk ]
+        # Haversine distance from each event county to every county.
+        a = ( np.sin( ( lat - lat[ origin, np.newaxis ] ) / 2 ) ** 2
+              + np.cos( lat[ origin, np.newaxis ] ) * np.cos( lat ) * np.sin( ( long - long[ origin, np.newaxis ] ) / 2 ) ** 2 )
+        near = ( 2 * EARTH_RADIUS * np.arcsin( np.sqrt( np.clip( a, 0, 1 ) ) ) <= radius ) & placed
+        near[ np.arange( len( chunk ) ), origin ] = True
+        e, r = np.nonzero( near )
+        events_out.append( chunk[ e ] )
+        rows_out.append( r )
+    return( np.concatenate( events_out ), np.concatenate( rows_out ) )
+
+
+def locate( cube, events ):
+    """Combined_Key for every event, from whichever location columns it has."""
+    if 'Combined_Key' in events:
+        return( events[ 'Combined_Key' ].values )
+    if 'FIPS' in events:
+        return( fips_keys( cube, events[ 'FIPS' ] ) )
+    if 'Lat' in events and 'Long_' in events:
+        return( nearest_keys( cube, events[ 'Lat' ], events[ 'Long_' ] ) )
+    if 'City' in events and 'State' in events:
+        return( resolve.resolve( events[ [ 'Date', 'City', 'State' ] ].reset_index( drop = True ) )[ 'Combined_Key' ].values )
+    raise ValueError( "events need Combined_Key, FIPS, Lat/Long_ or City/State columns" )
+
+
+def event_study( cube, events, before = constants.TIME_INTERVAL, after = None, metric = 'deaths',
+                 normalize = False, chunk_size = CHUNK_SIZE ):
+    """`<metric>_prior`, `<metric>_after` and `percent_change` for every event.
+
+    The windows are [ Date - before, Date ] and [ Date, Date + after ],
+    with `after` equal to `before` unless given. `percent_change` follows
+    the rally analysis and uses `metric`. Events that cannot be matched
+    to a county get NaN rather than the notebook's 0.
+    """
+    events = events.copy()
+    events[ 'Combined_Key' ] = locate( cube, events )
+
+    chunks = []
+    # One pass even with no events, so an empty result has the same columns.
+    for start in range( 0, max( len( events ), 1 ), chunk_size ):
+        chunk = events.iloc[ start:start + chunk_size ]
+        sums = window.rally_windows( cube, chunk, before, normalize, after )
+        sums[ window.event_positions( cube, chunk ) < 0 ] = np.nan
+        sums[ 'percent_change' ] = outcome.percent_change( sums[ metric + '_prior' ], sums[ metric + '_after' ] )
+        chunks.append( sums )
+    return( pd.concat( [ events, pd.concat( chunks ) ], axis = 1 ) )
+
+
+# --- END --- #
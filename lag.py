@@ -0,0 +1,112 @@
+#
+# lag.py
+#
+# Lag profiles: excess daily counts at each day from -lags to +lags around
+# a rally, relative to the county's own baseline just before that range.
+#
+# A single 42-day sum hides when deaths respond. The profiles for the
+# rally counties are one gather from the per-day matrix. The placebo
+# profiles, every county in the cube as if it had hosted every rally, are
+# a cross-correlation of each county series with the rally-date impulse
+# train, done for all counties at once with an FFT.
+#
+import numpy as np
+import pandas as pd
+
+import constants
+import transform
+import window
+
+BASELINE_DAYS = 14
+
+# Two-sided 95% normal quantile for the confidence bands.
+Z_95 = 1.959963984540054
+
+
+def _daily( cube, metric, kind, days, normalize ):
+    return( np.asarray( transform.transform( cube, kind, days, normalize )[ cube.metrics.index( metric ) ] ) )
+
+
+def _offsets( lags, baseline_days ):
+    return( np.arange( -lags - baseline_days, lags + 1 ) )
+
+
+def lag_profiles( cube, events, lags = constants.TIME_INTERVAL, baseline_days = BASELINE_DAYS,
+                  metric = 'deaths', kind = 'daily', days = 7, normalize = False ):
+    """Excess counts for every event ( rows ) at every lag ( columns ).
+
+    The baseline is the mean over the `baseline_days` days before -lags.
+    Events without a county or dated outside the data, and days outside
+    the data, are NaN.
+    """
+    series = _daily( cube, metric, kind, days, normalize )
+    offsets = _offsets( lags, baseline_days )
+
+    rows = window.event_positions( cube, events )
+    start = window.event_starts( cube, events )
+    positions = start[ :, np.newaxis ] + offsets
+    valid = ( ( rows >= 0 ) & ( start >= 0 ) )[ :, np.newaxis ] & ( positions >= 0 ) & ( positions < series.shape[ -1 ] )
+    values = series[ np.maximum( rows, 0 )[ :, np.newaxis ], np.clip( positions, 0, series.shape[ -1 ] - 1 ) ]
+    values = np.where( valid, values, np.nan )
+
+    before = values[ :, :baseline_days ]
+    with np.errstate( invalid = 'ignore' ):
+        baseline = ( np.nansum( before, axis = 1, keepdims = True )
+                     / np.isfinite( before ).sum( axis = 1, keepdims = True ) ) if baseline_days else 0.0
+    excess = values[ :, baseline_days: ] - baseline
+    return( pd.DataFrame( excess, index = events.index, columns = pd.Index( offsets[ baseline_days: ], name = 'lag' ) ) )
+
+
+def _correlate( series, impulses, offsets ):
+    """sum_t impulses[ t ] * series[ :, t + offset ] for each offset, by FFT."""
+    n = series.shape[ -1 ]
+    size = 1 << int( np.ceil( np.log2( n + np.abs( offsets ).max() + 1 ) ) )
+    spectrum = np.conj( np.fft.rfft( impulses, size ) ) * np.fft.rfft( series, size, axis = -1 )
+    circular = np.fft.irfft( spectrum, size, axis = -1 )
+    return( circular[ :, offsets % size ] )
+
+
+def placebo_profiles( cube, events, lags = constants.TIME_INTERVAL, baseline_days = BASELINE_DAYS,
+                      metric = 'deaths', kind = 'daily', days = 7, normalize = False ):
+    """Mean excess profile of every county over all event dates.
+
+    Row k answers "what would the average profile look like if county k
+    had hosted every event". Rally counties are included; drop their rows
+    to get a pure placebo set. The baseline is pooled over events, so a row
+    equals the mean of `lag_profiles` for that county wherever every event
+    window lies inside the data. Events dated outside the data are left out.
+    """
+    series = _daily( cube, metric, kind, days, normalize )
+    offsets = _offsets( lags, baseline_days )
+
+    start = window.event_starts( cube, events )
+    start = start[ start >= 0 ]
+    impulses = np.bincount( start, minlength = series.shape[ -1 ] ).astype( float )
+
+    observed = np.isfinite( series )
+    totals = _correlate( np.where( observed, series, 0.0 ), impulses, offsets )
+    counts = _correlate( observed.astype( float ), impulses, offsets )
+    counts = np.rint( counts )
+
+    with np.errstate( invalid = 'ignore', divide = 'ignore' ):
+        means = np.where( counts > 0, totals / counts, np.nan )
+        baseline = ( totals[ :, :baseline_days ].sum( axis = 1, keepdims = True )
+                     / counts[ :, :baseline_days ].sum( axis = 1, keepdims = True ) ) if baseline_days else 0.0
+    return( pd.DataFrame( means[ :, baseline_days: ] - baseline, index = cube.keys,
+                          columns = pd.Index( offsets[ baseline_days: ], name = 'lag' ) ) )
+
+
+def average_profile( profiles, z = Z_95 ):
+    """Mean profile across rows with a normal-approximation band."""
+    n = profiles.notna().sum()
+    mean = profiles.mean()
+    se = profiles.std() / np.sqrt( n )
+    return( pd.DataFrame( {
+        'mean': mean,
+        'ci_low': mean - z * se,
+        'ci_high': mean + z * se,
+        'n': n,
+    } ) )
+
+
+# --- END --- #
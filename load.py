@@ -0,0 +1,149 @@
+#
+# load.py
+#
+# Load the JHU CSSE county time series into a single metric x county x day
+# cube. Every metric shares one key index (Combined_Key) and one date
+# index (ISO dates), so a window over any metric is plain array slicing.
+#
+import os
+import json
+import re
+
+import numpy as np
+import pandas as pd
+
+import constants
+
+# County columns kept alongside the cube; the rest of a row is one column
+# per day, headed m/d/yy.
+META_COLUMNS = [ 'FIPS', 'Admin2', 'Province_State', 'Lat', 'Long_', 'Population' ]
+
+# The global files name their columns differently and have no
+# Combined_Key; see with_keys.
+GLOBAL_COLUMNS = { 'Province/State': 'Province_State', 'Country/Region': 'Country_Region', 'Long': 'Long_' }
+
+DATE_COLUMN = re.compile( r'^\d{1,2}/\d{1,2}/\d{2}$' )
+
+
+class Cube:
+    """Cumulative counts with shape ( metric, county, day ).
+
+    `values` may be an in-memory array or a read-only np.memmap; nothing
+    in the window engine cares which.
+    """
+
+    def __init__( self, values, metrics, keys, dates, meta ):
+        self.values = values
+        self.metrics = list( metrics )
+        self.keys = pd.Index( keys, name = 'Combined_Key' )
+        self.dates = pd.Index( dates, name = 'Date' )
+        self.meta = meta
+        # Derived arrays keyed by their parameters; see transform.py.
+        self.transforms = {}
+
+    @property
+    def shape( self ):
+        return( self.values.shape )
+
+    def metric( self, name ):
+        return( self.values[ self.metrics.index( name ) ] )
+
+    def day_numbers( self ):
+        return( np.array( self.dates, dtype = 'datetime64[D]' ) )
+
+    def __repr__( self ):
+        return( "Cube(metrics={0}, counties={1}, days={2}, {3} to {4})".format(
+            self.metrics, len( self.keys ), len( self.dates ), self.dates[ 0 ], self.dates[ -1 ] ) )
+
+
+def convert_to_iso( dates ):
+    # JHU headers are m/d/yy, the rest of the project uses ISO dates.
+    return( pd.to_datetime( pd.Index( dates ), format = '%m/%d/%y' ).strftime( '%Y-%m-%d' ) )
+
+
+def read_data( path ):
+    return( pd.read_csv( path,
+            sep=',',
+            comment='#',
+            skipinitialspace=True,
+            header=0,
+            na_values='?') )
+
+
+def date_columns( columns ):
+    return( [ c for c in columns if DATE_COLUMN.match( c ) ] )
+
+
+def with_keys( frame ):
+    """Give a global-format frame the US column names and a Combined_Key,
+    "Province, Country" or just "Country", as JHU builds it."""
+    if 'Combined_Key' in frame:
+        return( frame )
+    frame = frame.rename( columns = GLOBAL_COLUMNS )
+    province = frame[ 'Province_State' ].fillna( '' ).astype( str ).str.strip()
+    country = frame[ 'Country_Region' ].astype( str ).str.strip()
+    key = ( ( province + ', ' ).where( province != '', '' ) + country ).rename( 'Combined_Key' )
+    return( pd.concat( [ frame, key ], axis = 1 ) )
+
+
+def load_rallies( path = constants.RALLIES_FILE ):
+    return( read_data( path ) )
+
+
+def load_state_abbr( path = constants.STATE_ABBR_FILE ):
+    """Map of two-letter abbreviation to state name."""
+    state_abbr = read_data( path )
+    return( dict( zip( state_abbr.Abbr.str.strip(), state_abbr.State.str.strip() ) ) )
+
+
+def load_cube( metric_files = None ):
+    """Read one JHU file per metric and stack them on a shared index.
+
+    Metrics whose file is missing are skipped, except the first one,
+    which defines the key and date index.
+    """
+    if metric_files is None:
+        metric_files = constants.METRIC_FILES
+
+    frames = {}
+    for metric, path in metric_files.items():
+        if not frames or os.path.exists( path ):
+            frames[ metric ] = with_keys( read_data( path ) )
+
+    first = next( iter( frames.values() ) )
+    keys = pd.Index( first[ 'Combined_Key' ] )
+    days = date_columns( first.columns )
+
+    values = np.full( ( len( frames ), len( keys ), len( days ) ), np.nan )
+    for m, frame in enumerate( frames.values() ):
+        counts = frame.set_index( 'Combined_Key' ).reindex( index = keys, columns = days )
+        values[ m ] = counts.to_numpy( dtype = float )
+
+    meta = first.set_index( 'Combined_Key' ).reindex( columns = META_COLUMNS )
+    return( Cube( values, frames.keys(), keys, convert_to_iso( days ), meta ) )
+
+
+def save_cube( cube, path = constants.CUBE_DIR ):
+    """Write the cube as a raw .npy array plus its indexes, for open_cube."""
+    os.makedirs( path, exist_ok = True )
+    np.save( os.path.join( path, 'values.npy' ), np.ascontiguousarray( cube.values ) )
+    save_index( cube.meta, cube.metrics, cube.dates, path )
+
+
+def save_index( meta, metrics, dates, path = constants.CUBE_DIR ):
+    """Write the county metadata and the metric and date indexes of a saved cube."""
+    meta.to_csv( os.path.join( path, 'meta.csv' ) )
+    with open( os.path.join( path, 'index.json' ), 'w' ) as f:
+        json.dump( { 'metrics': list( metrics ), 'dates': list( dates ) }, f )
+
+
+def open_cube( path = constants.CUBE_DIR, mmap_mode = 'r' ):
+    """Open a saved cube; with mmap_mode set the values are not read into memory."""
+    values = np.load( os.path.join( path, 'values.npy' ), mmap_mode = mmap_mode )
+    meta = pd.read_csv( os.path.join( path, 'meta.csv' ), index_col = 'Combined_Key' )
+    with open( os.path.join( path, 'index.json' ) ) as f:
+        index = json.load( f )
+    return( Cube( values, index[ 'metrics' ], meta.index, index[ 'dates' ], meta ) )
+
+
+# --- END --- #
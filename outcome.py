@@ -0,0 +1,68 @@
+#
+# outcome.py
+#
+# Percent change, outcome class and display colour for whole arrays.
+#
+# These replace the notebook's row-wise `percent_change` and
+# `rally_colors` functions with identical results:
+#
+#   * 0 when deaths_prior == deaths_after
+#   * otherwise ( after - prior ) / prior, dividing by 1 when prior is 0
+#   * times 100, rounded to 2 decimals exactly as Python's round() does
+#   * NaN counts give a NaN change, no class and no colour
+#
+import numpy as np
+import pandas as pd
+
+INCREASE = "Increase"
+DECREASE = "Decrease"
+NO_CHANGE = "No change"
+
+COLORS = { INCREASE: "red", DECREASE: "green", NO_CHANGE: "blue" }
+
+# Products within this distance of a rounding tie are re-rounded one at a
+# time with round(), whose decimal handling np.round does not reproduce.
+TIE_TOLERANCE = 1e-6
+
+
+def _round( values, decimals = 2 ):
+    scaled = values * 10 ** decimals
+    rounded = np.round( values, decimals )
+    near_tie = np.abs( np.abs( scaled - np.floor( scaled ) ) - 0.5 ) < TIE_TOLERANCE
+    for i in np.flatnonzero( near_tie ):
+        rounded.flat[ i ] = round( float( values.flat[ i ] ), decimals )
+    return( rounded )
+
+
+def percent_change( deaths_prior, deaths_after ):
+    """Percent change from prior to after for arrays of counts."""
+    prior = np.asarray( deaths_prior, dtype = float )
+    after = np.asarray( deaths_after, dtype = float )
+    with np.errstate( invalid = 'ignore' ):
+        change = ( after - prior ) / np.where( prior == 0, 1.0, prior )
+    return( np.where( prior == after, 0.0, _round( change * 100 ) ) )
+
+
+def classify( percent_change ):
+    """INCREASE, DECREASE or NO_CHANGE for each change; None for NaN."""
+    change = np.asarray( percent_change, dtype = float )
+    return( np.select( [ change > 0, change < 0, change == 0 ], [ INCREASE, DECREASE, NO_CHANGE ], None ).astype( object ) )
+
+
+def colors( percent_change ):
+    """Marker colour for each change, as in the notebook plots."""
+    return( pd.Series( classify( percent_change ) ).map( COLORS ).values )
+
+
+def outcomes( frame, prior = 'deaths_prior', after = 'deaths_after' ):
+    """percent_change, outcome and mark_color columns for a frame of window sums."""
+    change = percent_change( frame[ prior ], frame[ after ] )
+    kind = classify( change )
+    return( pd.DataFrame( {
+        'percent_change': change,
+        'outcome': kind,
+        'mark_color': colors( change ),
+    }, index = frame.index ) )
+
+
+# --- END --- #
@@ -0,0 +1,145 @@
+#
+# outofcore.py
+#
+# Out-of-core processing for time series too large to hold in memory,
+# such as the global JHU files or multi-year combined files.
+#
+# build_cube streams each CSV from disk in row blocks ( and, for very wide
+# files, column blocks of days ) straight into a .npy file, so the
+# read_csv -> merge -> transpose chain never holds a whole file. The
+# result is opened as a memmap Cube, which the window engine already
+# handles: each window reads two cells per event, so only the pages it
+# touches are loaded. map_blocks applies any row-wise transform, such as
+# quality.repair or transform.daily, one block of counties at a time.
+#
+# Block sizes come from a memory budget in bytes ( MEMORY_BUDGET by
+# default ). Results match the in-memory path exactly, because the same
+# numbers go through the same window arithmetic.
+#
+import os
+
+import numpy as np
+import pandas as pd
+
+import constants
+import load
+import window
+
+BYTES_PER_VALUE = 8
+
+# Parsing a CSV block holds a few copies of it at once ( text, parsed
+# columns, the float frame ), so blocks get this fraction of the budget.
+PARSE_OVERHEAD = 8
+
+# Fewest rows worth reading per block; below this, days are split into
+# column blocks instead.
+MIN_BLOCK_ROWS = 64
+
+
+def _header( path ):
+    return( list( pd.read_csv( path, nrows = 0, skipinitialspace = True ).columns ) )
+
+
+def _key_columns( header ):
+    if 'Combined_Key' in header:
+        return( [ 'Combined_Key' ] )
+    return( [ 'Province/State', 'Country/Region' ] )
+
+
+def _read_blocks( path, columns, rows ):
+    return( pd.read_csv( path, sep=',', comment='#', skipinitialspace=True, header=0, na_values='?',
+                         usecols = columns, chunksize = rows ) )
+
+
+def block_shape( days, budget = constants.MEMORY_BUDGET ):
+    """( rows, days ) per block so a parsed block fits the budget."""
+    cells = max( budget // ( BYTES_PER_VALUE * PARSE_OVERHEAD ), 1 )
+    columns = min( days, max( cells // MIN_BLOCK_ROWS, 1 ) )
+    return( max( cells // columns, 1 ), columns )
+
+
+def scan( path, budget = constants.MEMORY_BUDGET ):
+    """Keys, metadata and date columns of a file, reading only non-date columns."""
+    header = _header( path )
+    days = load.date_columns( header )
+    info = [ c for c in header if c not in days ]
+    rows, _ = block_shape( len( info ), budget )
+    meta = pd.concat( [ load.with_keys( block ) for block in _read_blocks( path, info, rows ) ], ignore_index = True )
+    keys = pd.Index( meta[ 'Combined_Key' ] )
+    return( keys, days, meta.set_index( 'Combined_Key' ).reindex( columns = load.META_COLUMNS ) )
+
+
+def build_cube( metric_files = None, path = constants.CUBE_DIR, budget = constants.MEMORY_BUDGET ):
+    """Stream JHU files into a saved cube at `path` and open it as a memmap.
+
+    As with load.load_cube, the first file defines the keys and days and
+    missing later files are skipped.
+    """
+    if metric_files is None:
+        metric_files = constants.METRIC_FILES
+    files = { m: p for i, ( m, p ) in enumerate( metric_files.items() ) if i == 0 or os.path.exists( p ) }
+
+    keys, days, meta = scan( next( iter( files.values() ) ), budget )
+    os.makedirs( path, exist_ok = True )
+    values = np.lib.format.open_memmap( os.path.join( path, 'values.npy' ), mode = 'w+', dtype = float,
+                                        shape = ( len( files ), len( keys ), len( days ) ) )
+
+    for m, source in enumerate( files.values() ):
+        header = _header( source )
+        # Fill metric m with NaN first, so counties missing from this file stay missing.
+        rows, _ = block_shape( len( days ), budget )
+        for start in range( 0, len( keys ), rows ):
+            values[ m, start:start + rows ] = np.nan
+
+        present = set( header )
+        wanted = [ d for d in days if d in present ]
+        rows, columns = block_shape( len( wanted ), budget )
+        for first in range( 0, len( wanted ), columns ):
+            block = wanted[ first:first + columns ]
+            positions = [ days.index( d ) for d in block ] if block != days[ first:first + columns ] else None
+            for chunk in _read_blocks( source, _key_columns( header ) + block, rows ):
+                target = keys.get_indexer( load.with_keys( chunk )[ 'Combined_Key' ] )
+                found = target >= 0
+                counts = chunk[ block ].to_numpy( dtype = float )[ found ]
+                if positions is None:
+                    values[ m, target[ found ], first:first + len( block ) ] = counts
+                else:
+                    values[ m, target[ found ][ :, np.newaxis ], positions ] = counts
+        values.flush()
+
+    del values
+    load.save_index( meta, files, load.convert_to_iso( days ), path )
+    return( load.open_cube( path ) )
+
+
+def map_blocks( cube, function, path, budget = constants.MEMORY_BUDGET ):
+    """Apply a row-wise function of ( metric, county, day ) blocks into a new
+    cube saved at `path`, one block of counties at a time.
+
+    `function` must treat counties independently and keep the shape, as
+    transform.daily, transform.moving_average and quality.repair do.
+    """
+    os.makedirs( path, exist_ok = True )
+    values = np.lib.format.open_memmap( os.path.join( path, 'values.npy' ), mode = 'w+', dtype = float,
+                                        shape = cube.values.shape )
+    rows = max( budget // ( BYTES_PER_VALUE * PARSE_OVERHEAD * cube.values.shape[ 0 ] * cube.values.shape[ 2 ] ), 1 )
+    for start in range( 0, cube.values.shape[ 1 ], rows ):
+        values[ :, start:start + rows ] = function( np.asarray( cube.values[ :, start:start + rows ], dtype = float ) )
+    values.flush()
+
+    del values
+    load.save_index( cube.meta, cube.metrics, cube.dates, path )
+    return( load.open_cube( path ) )
+
+
+def rally_windows( cube, events, interval = constants.TIME_INTERVAL, after = None,
+                   budget = constants.MEMORY_BUDGET ):
+    """window.rally_windows over blocks of events, for memmap cubes and
+    event lists too long to gather at once."""
+    rows = max( budget // ( BYTES_PER_VALUE * PARSE_OVERHEAD * max( len( cube.metrics ), 1 ) ), 1 )
+    blocks = [ window.rally_windows( cube, events.iloc[ start:start + rows ], interval, after = after )
+               for start in range( 0, len( events ), rows ) ]
+    return( pd.concat( blocks ) if blocks else window.rally_windows( cube, events, interval, after = after ) )
+
+
+# --- END --- #
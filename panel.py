@@ -0,0 +1,179 @@
+#
+# panel.py
+#
+# Difference-in-differences over the full county x day panel.
+#
+# The pre/post `percent_change` cannot tell a rally effect from the
+# national wave. Here every county and every day enters one regression
+# with county and date fixed effects, so the wave is absorbed by the date
+# effects and each county's level by the county effects. The fixed
+# effects are swept out by within-transformation ( alternating
+# demeaning ), so nothing of size county x day x county is ever built, and
+# the event indicators stay sparse, so the fit stays cheap at thousands of
+# counties and years of days.
+# Standard errors are clustered by county.
+#
+import math
+
+import numpy as np
+import pandas as pd
+
+import constants
+import transform
+import window
+
+TOLERANCE = 1e-8
+MAX_ITERATIONS = 1000
+
+
+def demean( values, observed, tolerance = TOLERANCE, max_iterations = MAX_ITERATIONS ):
+    """Sweep county and date means out of a ( county, day ) array.
+
+    Unobserved cells are held at 0 and left out of every mean. A balanced
+    panel converges in one pass; gaps take a few more.
+    """
+    values = np.where( observed, values, 0.0 )
+    weight = observed.astype( float )
+    per_county = np.maximum( weight.sum( axis = 1, keepdims = True ), 1 )
+    per_day = np.maximum( weight.sum( axis = 0, keepdims = True ), 1 )
+
+    for _ in range( max_iterations ):
+        county_means = values.sum( axis = 1, keepdims = True ) / per_county
+        values -= county_means * weight
+        day_means = values.sum( axis = 0, keepdims = True ) / per_day
+        values -= day_means * weight
+        if max( np.abs( county_means ).max(), np.abs( day_means ).max() ) < tolerance:
+            break
+    return( values )
+
+
+def _dense( shape, column ):
+    rows, days, counts = column
+    values = np.zeros( shape )
+    np.add.at( values, ( rows, days ), counts )
+    return( values )
+
+
+def fit( outcome, regressors, names ):
+    """OLS of `outcome` ( county, day ) on sparse `regressors` with two-way
+    fixed effects and county-clustered standard errors.
+
+    Each regressor is a ( rows, days, values ) triple of its nonzero cells.
+    Columns are demeaned one at a time, so memory stays a few county x day
+    arrays whatever the number of regressors; the price is demeaning each
+    column three times, once per pass below.
+    """
+    observed = np.isfinite( outcome )
+    y = demean( outcome, observed )
+
+    def within( i ):
+        return( demean( _dense( outcome.shape, regressors[ i ] ), observed ) )
+
+    def cells( values, column ):
+        rows, days, counts = column
+        return( ( values[ rows, days ] * counts ).sum() )
+
+    # The within transformation is a projection, so x'y and x'x only need
+    # one side demeaned, and the other side can stay sparse.
+    k = len( regressors )
+    xx = np.empty( ( k, k ) )
+    xy = np.empty( k )
+    for i in range( k ):
+        x = within( i )
+        xx[ i ] = [ cells( x, column ) for column in regressors ]
+        xy[ i ] = cells( y, regressors[ i ] )
+    xx = ( xx + xx.T ) / 2
+    bread = np.linalg.pinv( xx )
+    beta = bread @ xy
+
+    residual = y
+    for i in range( k ):
+        residual -= beta[ i ] * within( i )
+    residual[ ~observed ] = 0.0
+    scores = np.column_stack( [ ( within( i ) * residual ).sum( axis = 1 ) for i in range( k ) ] )
+
+    clusters = int( ( observed.sum( axis = 1 ) > 0 ).sum() )
+    n = int( observed.sum() )
+    absorbed = clusters + int( ( observed.sum( axis = 0 ) > 0 ).sum() ) - 1
+    correction = ( clusters / max( clusters - 1, 1 ) ) * ( ( n - 1 ) / max( n - absorbed - len( beta ), 1 ) )
+    covariance = correction * bread @ ( scores.T @ scores ) @ bread
+
+    se = np.sqrt( np.maximum( np.diag( covariance ), 0 ) )
+    with np.errstate( divide = 'ignore', invalid = 'ignore' ):
+        t = beta / se
+    p = np.array( [ math.erfc( abs( v ) / math.sqrt( 2 ) ) if np.isfinite( v ) else np.nan for v in t ] )
+    result = pd.DataFrame( {
+        'estimate': beta,
+        'std_error': se,
+        't': t,
+        'p_value': p,
+        'ci_low': beta - 1.96 * se,
+        'ci_high': beta + 1.96 * se,
+    }, index = pd.Index( names, name = 'term' ) )
+    result.attrs.update( observations = n, clusters = clusters )
+    return( result )
+
+
+def _outcome( cube, metric, kind, days, normalize ):
+    return( np.asarray( transform.transform( cube, kind, days, normalize )[ cube.metrics.index( metric ) ] ) )
+
+
+def _event_cells( cube, events ):
+    """County row and day position of each event that matched the cube,
+    on a date inside the data."""
+    rows = window.event_positions( cube, events )
+    start = window.event_starts( cube, events )
+    keep = ( rows >= 0 ) & ( start >= 0 )
+    return( rows[ keep ], start[ keep ] )
+
+
+def _indicators( shape, rows, start, offsets, columns, k ):
+    """Count of events at each ( county, day ) offset, binned into `columns`,
+    as k sparse ( rows, days, counts ) columns for `fit`."""
+    positions = start[ :, np.newaxis ] + offsets
+    inside = ( positions >= 0 ) & ( positions < shape[ 1 ] ) & ( columns >= 0 )
+    event_rows = np.broadcast_to( rows[ :, np.newaxis ], positions.shape )[ inside ]
+    column = np.broadcast_to( columns, positions.shape )[ inside ]
+    positions = positions[ inside ]
+    return( [ ( event_rows[ column == i ], positions[ column == i ], np.ones( ( column == i ).sum() ) )
+              for i in range( k ) ] )
+
+
+def difference_in_differences( cube, events, metric = 'deaths', interval = constants.TIME_INTERVAL,
+                               kind = 'daily', days = 7, normalize = True ):
+    """Single 'post' coefficient: the average change in the outcome over
+    the `interval` days after a rally, relative to the same county and
+    the same day elsewhere.
+    """
+    outcome = _outcome( cube, metric, kind, days, normalize )
+    rows, start = _event_cells( cube, events )
+    offsets = np.arange( 0, interval + 1 )
+    regressors = _indicators( outcome.shape, rows, start, offsets, np.zeros_like( offsets ), 1 )
+    return( fit( outcome, regressors, [ 'post' ] ) )
+
+
+def event_study( cube, events, metric = 'deaths', leads = 6, lags = 8, bin_days = 7,
+                 reference = -1, kind = 'daily', days = 7, normalize = True ):
+    """Lead and lag coefficients from one fit.
+
+    Days around each rally are grouped into `bin_days`-wide bins, from
+    `leads` bins before to `lags` bins after ( bin 0 starts on the rally
+    day ). Bin `reference` is omitted, so every coefficient is relative to
+    it; days outside the bins act as controls.
+    """
+    outcome = _outcome( cube, metric, kind, days, normalize )
+    rows, start = _event_cells( cube, events )
+
+    offsets = np.arange( -leads * bin_days, ( lags + 1 ) * bin_days )
+    bins = np.floor_divide( offsets, bin_days )
+    terms = [ b for b in range( -leads, lags + 1 ) if b != reference ]
+    columns = np.array( [ terms.index( b ) if b in terms else -1 for b in bins ] )
+
+    regressors = _indicators( outcome.shape, rows, start, offsets, columns, len( terms ) )
+    result = fit( outcome, regressors, [ 'bin_{0}'.format( b ) for b in terms ] )
+    result.insert( 0, 'event_time', terms )
+    result.insert( 1, 'first_day', [ b * bin_days for b in terms ] )
+    return( result )
+
+
+# --- END --- #
@@ -0,0 +1,95 @@
+#
+# pipeline.py
+#
+# The notebook as a script: load -> resolve -> compute -> store -> render.
+#
+#     python3 pipeline.py                   # everything, as the notebook does
+#     python3 pipeline.py --compute-only    # CSV outputs only, no plots
+#     python3 pipeline.py --out-of-core     # stream the time series through data/cube
+#
+# With --compute-only neither the plotting nor the geospatial stack is
+# imported, and no BING_API_KEY is needed for rallies already present in
+# data/trump-rallies-augmented.csv.
+#
+import argparse
+
+import constants
+import compute
+import load
+import resolve
+import store
+
+
+def run( interval = constants.TIME_INTERVAL, render_plots = True, write = True,
+         scenario = 'baseline', run_id = 'latest', raster = None, out_of_core = False,
+         memory_budget = constants.MEMORY_BUDGET ):
+    if out_of_core:
+        import outofcore
+
+        cube = outofcore.build_cube( budget = memory_budget )
+    else:
+        cube = load.load_cube()
+    rallies = resolve.resolve( load.load_rallies() )
+
+    augmented = compute.augment( cube, rallies, interval )
+
+    # Without write nothing on disk changes, and the plots read the
+    # in-memory table instead of the store.
+    def results( columns ):
+        if write:
+            return( store.read_results( columns, scenario, run_id ) )
+        return( augmented[ columns ] )
+
+    if write:
+        store.write_results( augmented, scenario, run_id )
+        # The CSVs, and the geocoding cache among them, follow the latest
+        # baseline run only; other scenarios and runs live in the store.
+        if ( scenario, run_id ) == ( 'baseline', 'latest' ):
+            store.export_csvs( scenario, run_id )
+
+    if render_plots:
+        import render
+
+        render.histogram( results( [ 'percent_change' ] ) )
+        locations = results( store.LOCATION_COLUMNS )
+        time_series = results( store.TIME_SERIES_COLUMNS )
+        if raster is None:
+            raster = len( locations ) > constants.RASTER_THRESHOLD
+        if raster:
+            render.map_raster( locations )
+            render.time_series_raster( time_series )
+        else:
+            render.rally_map( compute.locations( locations ) )
+            render.time_series_plot( compute.time_series( time_series ) )
+
+    return( augmented )
+
+
+def main( argv = None ):
+    parser = argparse.ArgumentParser( description = "Rally windows, percent change and plots." )
+    parser.add_argument( '--compute-only', action = 'store_true', help = "skip the plots" )
+    parser.add_argument( '--no-write', action = 'store_true',
+                         help = "write neither the results store nor the CSV outputs "
+                                "(only the baseline, latest run writes the CSVs)" )
+    parser.add_argument( '--raster', action = 'store_true', default = None,
+                         help = "bin the map and time-series plots into a grid (default: above {0} points)".format(
+                             constants.RASTER_THRESHOLD ) )
+    parser.add_argument( '--scenario', default = 'baseline', help = "results store partition (default: %(default)s)" )
+    parser.add_argument( '--run', default = 'latest', help = "results store run id (default: %(default)s)" )
+    parser.add_argument( '--interval', type = int, default = constants.TIME_INTERVAL,
+                         help = "days before and after each rally (default: %(default)s)" )
+    parser.add_argument( '--out-of-core', action = 'store_true',
+                         help = "build the cube on disk in blocks instead of reading the CSVs into memory" )
+    parser.add_argument( '--memory-budget', type = int, default = constants.MEMORY_BUDGET >> 20,
+                         help = "out-of-core block budget in MB (default: %(default)s)" )
+    args = parser.parse_args( argv )
+    run( args.interval, render_plots = not args.compute_only, write = not args.no_write,
+         scenario = args.scenario, run_id = args.run, raster = args.raster,
+         out_of_core = args.out_of_core, memory_budget = args.memory_budget << 20 )
+
+
+if __name__ == '__main__':
+    main()
+
+
+# --- END --- #
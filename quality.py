@@ -0,0 +1,138 @@
+#
+# quality.py
+#
+# Detect and repair anomalies in the cumulative county series.
+#
+# JHU revises cumulative counts downward from time to time, which turns
+# into negative "daily deaths" after `diff()`; counties also stop
+# reporting for a stretch and then catch up in a single day. Everything
+# here works on the full ( county, day ) matrix, or the whole cube, in a
+# handful of array passes with no per-county loop.
+#
+import numpy as np
+import pandas as pd
+
+import load
+import transform
+
+STRATEGIES = ( 'flag', 'clip', 'backfill' )
+
+# A run of zero days this long in a county that was averaging at least
+# FLAT_RATE daily counts just before it is treated as a reporting gap.
+FLAT_DAYS = 14
+FLAT_RATE = 1.0
+
+# A day is an outlier when it exceeds the mean of its neighbours by
+# OUTLIER_Z Poisson standard deviations and is at least OUTLIER_MIN.
+OUTLIER_HALF_WINDOW = 3
+OUTLIER_Z = 5.0
+OUTLIER_MIN = 5
+
+
+def _run_lengths( mask ):
+    """Length of the True run each position belongs to ( 0 where False )."""
+    days = np.arange( mask.shape[ -1 ] )
+    start = np.maximum.accumulate( np.where( mask, -1, days ), axis = -1 )
+    end = np.minimum.accumulate( np.where( mask, mask.shape[ -1 ], days )[ ..., ::-1 ], axis = -1 )[ ..., ::-1 ]
+    return( np.where( mask, end - start - 1, 0 ), start )
+
+
+def negative_days( counts ):
+    return( counts < 0 )
+
+
+def flat_days( cumulative, counts, days = FLAT_DAYS, rate = FLAT_RATE ):
+    """Zero-count runs of at least `days` that follow a period of reporting."""
+    zero = counts == 0
+    length, start = _run_lengths( zero )
+
+    # Average daily count over the `days` before each run began.
+    average = transform.moving_average( cumulative, days )
+    before = np.take_along_axis( average, np.maximum( start, 0 ), axis = -1 )
+    return( zero & ( length >= days ) & ( start >= 0 ) & ( before >= rate ) )
+
+
+def outlier_days( counts, half_window = OUTLIER_HALF_WINDOW, z = OUTLIER_Z, minimum = OUTLIER_MIN ):
+    """Days far above the mean of the surrounding `half_window` days on each side."""
+    filled = np.nan_to_num( counts )
+    running = np.concatenate( [ np.zeros( counts.shape[ :-1 ] + ( 1, ) ), np.cumsum( filled, axis = -1 ) ], axis = -1 )
+
+    n = counts.shape[ -1 ]
+    days = np.arange( n )
+    lo = np.maximum( days - half_window, 0 )
+    hi = np.minimum( days + half_window + 1, n )
+    neighbours = running[ ..., hi ] - running[ ..., lo ] - filled
+    local = neighbours / ( hi - lo - 1 )
+    return( ( filled >= minimum ) & ( filled > local + z * np.sqrt( np.maximum( local, 0 ) + 1 ) ) )
+
+
+def detect( cumulative, **options ):
+    """Boolean masks, shaped like the daily counts, for each anomaly type."""
+    counts = transform.daily( cumulative )
+    flat_options = { k: options[ k ] for k in ( 'days', 'rate' ) if k in options }
+    outlier_options = { k: options[ k ] for k in ( 'half_window', 'z', 'minimum' ) if k in options }
+    return( {
+        'negative': negative_days( counts ),
+        'flat': flat_days( cumulative, counts, **flat_options ),
+        'outlier': outlier_days( counts, **outlier_options ),
+    } )
+
+
+def repair( cumulative, strategy = 'backfill' ):
+    """Make a cumulative series non-decreasing.
+
+    'flag'      returns the series unchanged; use `detect` or `report`.
+    'clip'      sets negative daily counts to 0, which keeps every reported
+                increase and so can raise the final total.
+    'backfill'  pushes each downward revision back onto the preceding days
+                ( a reverse running minimum ), which keeps the final total.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError( "strategy must be one of {0}, not {1!r}".format( STRATEGIES, strategy ) )
+
+    cumulative = np.asarray( cumulative, dtype = float )
+    if strategy == 'flag':
+        return( cumulative )
+
+    missing = np.isnan( cumulative )
+    if strategy == 'clip':
+        # Carry the last reported value across gaps, so the increase over a
+        # missing stretch is kept rather than dropped with its NaN difference.
+        last = np.maximum.accumulate( np.where( missing, 0, np.arange( cumulative.shape[ -1 ] ) ), axis = -1 )
+        filled = np.nan_to_num( np.take_along_axis( cumulative, last, axis = -1 ) )
+        counts = np.maximum( transform.daily( filled ), 0 )
+        counts[ ..., 0 ] = filled[ ..., 0 ]
+        repaired = np.cumsum( counts, axis = -1 )
+    else:
+        # fmin skips NaN, so a missing day does not spread to the days before it.
+        repaired = np.fmin.accumulate( cumulative[ ..., ::-1 ], axis = -1 )[ ..., ::-1 ]
+    repaired[ missing ] = np.nan
+    return( repaired )
+
+
+def repaired_cube( cube, strategy = 'backfill' ):
+    """A new cube sharing the indexes of `cube` with repaired values."""
+    if strategy == 'flag':
+        return( cube )
+    return( load.Cube( repair( cube.values, strategy ), cube.metrics, cube.keys, cube.dates, cube.meta ) )
+
+
+def report( cube, **options ):
+    """Per-county anomaly counts, one row per ( metric, Combined_Key )."""
+    frames = []
+    for m, metric in enumerate( cube.metrics ):
+        cumulative = np.asarray( cube.values[ m ], dtype = float )
+        counts = transform.daily( cumulative )
+        masks = detect( cumulative, **options )
+        frame = pd.DataFrame( {
+            'negative_days': masks[ 'negative' ].sum( axis = -1 ),
+            'negative_total': -np.where( masks[ 'negative' ], counts, 0 ).sum( axis = -1 ),
+            'flat_days': masks[ 'flat' ].sum( axis = -1 ),
+            'outlier_days': masks[ 'outlier' ].sum( axis = -1 ),
+        }, index = cube.keys )
+        frame[ 'anomalous' ] = frame[ [ 'negative_days', 'flat_days', 'outlier_days' ] ].sum( axis = 1 ) > 0
+        frames.append( frame )
+    return( pd.concat( frames, keys = cube.metrics, names = [ 'metric', 'Combined_Key' ] ) )
+
+
+# --- END --- #
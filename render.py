@@ -0,0 +1,180 @@
+#
+# render.py
+#
+# Plots. matplotlib and the geospatial stack are imported inside each
+# function, so importing this module, or running the pipeline with
+# --compute-only, costs nothing.
+#
+# The scatter and map plots draw one marker per rally. For large event
+# lists the *_raster variants bin the points into a fixed grid first and
+# draw one image, so their drawing time depends on the grid, not on the
+# number of points.
+#
+import numpy as np
+
+import constants
+import outcome
+import rates
+
+FIGURE_SIZE = [ 18, 5 ]
+
+MAP_EXTENT = ( -128, -65, 22, 51 )
+
+
+def histogram( augmented, path = constants.HISTOGRAM_PLOT, weight_by_precision = False, min_precision = None ):
+    """Histogram of percent_change.
+
+    With the rate ratio interval columns present, rallies can be weighted
+    by the precision of their rate ratio, or dropped below min_precision
+    ( see rates.precision ).
+    """
+    from matplotlib import pyplot as plt
+
+    weights = None
+    if weight_by_precision or min_precision is not None:
+        weight = rates.precision( augmented )
+        if min_precision is not None:
+            augmented, weight = augmented[ weight >= min_precision ], weight[ weight >= min_precision ]
+        if weight_by_precision:
+            weights = weight
+
+    fig_1, ax = plt.subplots()
+    augmented[ 'percent_change' ].hist( figsize = FIGURE_SIZE, ax = ax, weights = weights )
+    plt.ylabel("Weighted number of counties" if weights is not None else "Number of counties",fontsize=12)
+    plt.xlabel("Percentage change",fontsize=12)
+
+    mean_change = augmented[ 'percent_change' ].mean()
+    std_change = augmented[ 'percent_change' ].std()
+    median_change = augmented[ 'percent_change' ].median()
+    s = "Median: {0:.3}\nMean: {1:.3}\nStd: {2:.3}".format( median_change, mean_change, std_change)
+    plt.text(1200, 22, s )
+
+    plt.axvline(x=median_change, color='orange', linewidth = 4)
+    plt.axvline(x=mean_change, color='red', linewidth = 4)
+    plt.axvline(x=mean_change + std_change, color='green', linewidth = 4)
+    plt.axvline(x=mean_change - std_change, color='green', linewidth = 4)
+
+    fig_1.savefig( path, bbox_inches = 'tight' )
+    plt.close( fig_1 )
+
+
+def rally_map( locations, path = constants.MAP_PLOT ):
+    from matplotlib import pyplot as plt
+    import descartes  # noqa: F401 -- polygon patches for older geopandas
+    import geopandas as gpd
+    from shapely.geometry import Point
+
+    points = [ Point( xy ) for xy in zip( locations[ "Long_" ], locations[ "Lat" ] ) ]
+    locations_geo = gpd.GeoDataFrame( locations.drop( columns = 'geometry', errors = 'ignore' ),
+                                      crs = "EPSG:4326", geometry = points )
+
+    fig, ax = plt.subplots( figsize = ( 30, 30 ))
+    us_map = gpd.read_file( constants.STATE_SHAPES_FILE )
+    us_map.plot( ax = ax, color = "#C1CDCD", alpha = 0.9, edgecolor = "black" )
+    ax.set_xlim(-128, -65)
+    ax.set_ylim(22, 51)
+
+    classes = outcome.classify( locations_geo[ "percent_change" ] )
+    for label in ( outcome.INCREASE, outcome.DECREASE, outcome.NO_CHANGE ):
+        locations_geo[ classes == label ].plot( ax = ax, color = outcome.COLORS[ label ], label = label )
+
+    plt.legend( prop = {'size':15})
+    fig.savefig( path, bbox_inches = 'tight' )
+    plt.close( fig )
+
+
+def time_series_plot( time_series, path = constants.TIME_SERIES_PLOT ):
+    from matplotlib import pyplot as plt
+
+    ax = time_series.plot.scatter( x = "Date", y = "percent_change", s = 75, color=time_series[ "mark_color" ],
+                                   figsize = ( 30, 10 ), grid = True, rot = 90 )
+    ax.figure.savefig( path, bbox_inches = 'tight')
+    plt.close( ax.figure )
+
+
+def aggregate( x, y, values, bins, extent ):
+    """Per-cell count and mean of `values` on a bins[ 0 ] x bins[ 1 ] grid.
+
+    `extent` is ( x_min, x_max, y_min, y_max ); points outside it and NaN
+    values are dropped. Returns counts and means shaped ( y, x ), with NaN
+    means for empty cells, so they can go straight to imshow.
+    """
+    x, y, values = ( np.asarray( a, dtype = float ) for a in ( x, y, values ) )
+    keep = np.isfinite( x ) & np.isfinite( y ) & np.isfinite( values )
+    ranges = [ extent[ 0:2 ], extent[ 2:4 ] ]
+    counts, _, _ = np.histogram2d( x[ keep ], y[ keep ], bins = bins, range = ranges )
+    totals, _, _ = np.histogram2d( x[ keep ], y[ keep ], bins = bins, range = ranges, weights = values[ keep ] )
+    with np.errstate( invalid = 'ignore', divide = 'ignore' ):
+        means = np.where( counts > 0, totals / counts, np.nan )
+    return( counts.T, means.T )
+
+
+def _draw_raster( ax, counts, means, extent, value ):
+    from matplotlib import colors
+
+    if value == 'count':
+        image = np.where( counts > 0, counts, np.nan )
+        norm, cmap = colors.LogNorm( vmin = 1, vmax = max( counts.max(), 1 ) ), 'viridis'
+    else:
+        image = means
+        # Decreases green, increases red, as in the marker plots.
+        limit = max( np.nanmax( np.abs( means ) ) if np.isfinite( means ).any() else 1, 1e-9 )
+        norm, cmap = colors.TwoSlopeNorm( 0, -limit, limit ), 'RdYlGn_r'
+    return( ax.imshow( image, origin = 'lower', extent = extent, aspect = 'auto', interpolation = 'nearest',
+                       norm = norm, cmap = cmap ) )
+
+
+def time_series_raster( time_series, path = constants.TIME_SERIES_PLOT, bins = ( 240, 120 ),
+                        value = 'count', change_range = None ):
+    """Date x percent_change grid coloured by the number of events per cell
+    ( or by their mean change ).
+
+    Date bins are never narrower than one day. change_range defaults to
+    the 1st to 99th percentile, so a few huge changes from tiny counts do
+    not squash the grid; changes outside it are counted in the top and
+    bottom rows, so every event with a date is on the plot.
+    """
+    from matplotlib import dates as mdates
+    from matplotlib import pyplot as plt
+
+    dates = np.array( time_series[ "Date" ], dtype = 'datetime64[D]' )
+    # NaT casts to a huge negative number, not NaN; aggregate drops NaN.
+    days = np.where( np.isnat( dates ), np.nan, dates.astype( float ) )
+    change = time_series[ "percent_change" ].to_numpy( dtype = float )
+    if change_range is None:
+        change_range = tuple( np.nanpercentile( change, [ 1, 99 ] ) )
+    extent = ( np.nanmin( days ), np.nanmax( days ) + 1 ) + tuple( change_range )
+    bins = ( int( min( bins[ 0 ], extent[ 1 ] - extent[ 0 ] ) ), bins[ 1 ] )
+    counts, means = aggregate( days, np.clip( change, *change_range ), change, bins, extent )
+
+    fig, ax = plt.subplots( figsize = ( 30, 10 ) )
+    image = _draw_raster( ax, counts, means, extent, value )
+    fig.colorbar( image, ax = ax, label = "Number of events" if value == 'count' else "Mean percentage change" )
+    ax.xaxis.set_major_formatter( mdates.DateFormatter( '%Y-%m-%d' ) )
+    ax.set_xlabel( "Date" )
+    ax.set_ylabel( "percent_change" )
+    ax.grid( True )
+    fig.savefig( path, bbox_inches = 'tight' )
+    plt.close( fig )
+
+
+def map_raster( locations, path = constants.MAP_PLOT, bins = ( 252, 116 ), value = 'mean', extent = MAP_EXTENT ):
+    """Longitude x latitude grid over the state outlines, coloured by mean
+    percent_change ( or count ) per cell."""
+    from matplotlib import pyplot as plt
+    import geopandas as gpd
+
+    counts, means = aggregate( locations[ "Long_" ], locations[ "Lat" ], locations[ "percent_change" ], bins, extent )
+
+    fig, ax = plt.subplots( figsize = ( 30, 30 ))
+    us_map = gpd.read_file( constants.STATE_SHAPES_FILE )
+    us_map.plot( ax = ax, color = "#C1CDCD", alpha = 0.9, edgecolor = "black" )
+    image = _draw_raster( ax, counts, means, extent, value )
+    fig.colorbar( image, ax = ax, shrink = 0.4, label = "Number of events" if value == 'count' else "Mean percentage change" )
+    ax.set_xlim( *extent[ 0:2 ] )
+    ax.set_ylim( *extent[ 2:4 ] )
+    fig.savefig( path, bbox_inches = 'tight' )
+    plt.close( fig )
+
+
+# --- END --- #
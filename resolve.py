@@ -0,0 +1,71 @@
+#
+# resolve.py
+#
+# Resolve rally cities to JHU counties.
+#
+# Counties come from the Bing geocoder, but only for rallies that are not
+# already in the previous run's augmented output. `geocoder` is imported,
+# and BING_API_KEY read, only when a lookup is actually needed, so
+# rerunning the numbers on known rallies works offline.
+#
+import os
+
+import pandas as pd
+
+import constants
+import load
+
+# A place has one county whatever the date, so lookups are keyed by place.
+PLACE_COLUMNS = [ 'City', 'State' ]
+
+# Bing returns no adminDistrict2 for The Villages, FL.
+FALLBACK_COUNTY = 'Sumpter County'
+
+
+def gcode( city, state ):
+    import geocoder
+
+    g = geocoder.bing( city + ", " + state, key=os.environ[ 'BING_API_KEY' ] )
+    if 'adminDistrict2' in g.json[ 'raw' ][ 'address' ]:
+        return( g.json[ 'raw' ][ 'address' ][ 'adminDistrict2' ] )
+    else:
+        return( FALLBACK_COUNTY )
+
+
+def cached_counties( path = constants.AUGMENTED_FILE ):
+    if not os.path.exists( path ):
+        return( pd.DataFrame( columns = PLACE_COLUMNS + [ 'County' ] ) )
+    cache = load.read_data( path )
+    return( cache[ PLACE_COLUMNS + [ 'County' ] ].drop_duplicates( PLACE_COLUMNS ) )
+
+
+def resolve_counties( rallies, cache = constants.AUGMENTED_FILE ):
+    """Add a County column, geocoding each place missing from `cache` once."""
+    rallies = rallies.merge( cached_counties( cache ), how = 'left', on = PLACE_COLUMNS )
+    missing = rallies[ 'County' ].isna()
+    if missing.any():
+        places = list( zip( rallies.loc[ missing, 'City' ], rallies.loc[ missing, 'State' ] ) )
+        counties = { place: gcode( *place ) for place in dict.fromkeys( places ) }
+        rallies.loc[ missing, 'County' ] = [ counties[ place ] for place in places ]
+    return( rallies )
+
+
+def combined_keys( rallies, map_abbr_state = None ):
+    """JHU Combined_Key for each rally, e.g. "Tulsa, Oklahoma, US".
+
+    The last six characters of the Bing county, " County", are dropped;
+    independent cities such as "Newport News City" therefore lose a
+    letter too, which is how they appear in the published results.
+    """
+    if map_abbr_state is None:
+        map_abbr_state = load.load_state_abbr()
+    return( rallies[ 'County' ].str[ 0:-6 ].str.rstrip() + ", " + rallies[ 'State' ].map( map_abbr_state ) + ", " + 'US' )
+
+
+def resolve( rallies, cache = constants.AUGMENTED_FILE ):
+    rallies = resolve_counties( rallies, cache )
+    rallies[ 'Combined_Key' ] = combined_keys( rallies )
+    return( rallies )
+
+
+# --- END --- #
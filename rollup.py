@@ -0,0 +1,101 @@
+#
+# rollup.py
+#
+# Pre-aggregated summaries of the windowed results by state or region,
+# month and outcome class.
+#
+# Every event updates twelve cells: its state, its Census region and "*"
+# ( all areas ), times its month and "*", times its outcome class and
+# "*". Counts and sums are kept per cell and the values of each measure
+# are kept sorted, so any count, sum, mean or median, including the
+# margins, is one dictionary lookup. Adding events touches only the
+# cells they fall in.
+#
+#     rollups = rollup.Rollup( augmented )
+#     rollups.query( area = 'WI', outcome = 'Increase' )[ 'count' ]
+#
+import numpy as np
+import pandas as pd
+
+import constants
+import outcome
+import store
+
+ALL = '*'
+
+MEASURES = [ 'deaths_prior', 'deaths_after', 'percent_change' ]
+
+# US Census Bureau regions.
+REGIONS = {
+    'Northeast': [ 'CT', 'ME', 'MA', 'NH', 'RI', 'VT', 'NJ', 'NY', 'PA' ],
+    'Midwest': [ 'IL', 'IN', 'MI', 'OH', 'WI', 'IA', 'KS', 'MN', 'MO', 'NE', 'ND', 'SD' ],
+    'South': [ 'DE', 'DC', 'FL', 'GA', 'MD', 'NC', 'SC', 'VA', 'WV', 'AL', 'KY', 'MS', 'TN',
+               'AR', 'LA', 'OK', 'TX' ],
+    'West': [ 'AZ', 'CO', 'ID', 'MT', 'NV', 'NM', 'UT', 'WY', 'AK', 'CA', 'HI', 'OR', 'WA' ],
+}
+
+STATE_REGION = { state: region for region, states in REGIONS.items() for state in states }
+
+
+def _cell_keys( events ):
+    """Each event repeated for the twelve ( area, month, outcome ) cells it belongs to."""
+    state = events[ 'State' ].astype( str ).str.strip()
+    region = state.map( STATE_REGION ).fillna( 'Other' )
+    month = pd.to_datetime( events[ 'Date' ] ).dt.strftime( '%Y-%m' )
+    result_class = pd.Series( outcome.classify( events[ 'percent_change' ] ), index = events.index )
+
+    frames = []
+    for area in ( state, region, pd.Series( ALL, index = events.index ) ):
+        for period in ( month, pd.Series( ALL, index = events.index ) ):
+            for result in ( result_class, pd.Series( ALL, index = events.index ) ):
+                cells = events[ MEASURES ].copy()
+                cells[ 'area' ], cells[ 'month' ], cells[ 'outcome' ] = area.values, period.values, result.values
+                frames.append( cells )
+    return( pd.concat( frames, ignore_index = True ) )
+
+
+class Rollup:
+    """Counts, sums, means and medians of MEASURES for every cell."""
+
+    def __init__( self, events = None ):
+        self.cells = {}
+        if events is not None:
+            self.add( events )
+
+    def add( self, events ):
+        """Fold more events in; needs State, Date and the MEASURES columns."""
+        for key, group in _cell_keys( events ).groupby( [ 'area', 'month', 'outcome' ] ):
+            cell = self.cells.setdefault( key, { 'count': 0, 'sum': dict.fromkeys( MEASURES, 0.0 ),
+                                                 'values': { m: np.empty( 0 ) for m in MEASURES } } )
+            cell[ 'count' ] += len( group )
+            for measure in MEASURES:
+                values = group[ measure ].dropna().to_numpy( dtype = float )
+                cell[ 'sum' ][ measure ] += values.sum()
+                cell[ 'values' ][ measure ] = np.sort( np.concatenate( [ cell[ 'values' ][ measure ], values ] ) )
+        return( self )
+
+    def query( self, area = ALL, month = ALL, outcome = ALL ):
+        """Summary of one cell; an empty cell has count 0 and NaN statistics."""
+        cell = self.cells.get( ( area, month, outcome ) )
+        summary = { 'count': 0 if cell is None else cell[ 'count' ] }
+        for measure in MEASURES:
+            values = np.empty( 0 ) if cell is None else cell[ 'values' ][ measure ]
+            n = len( values )
+            summary[ measure + '_sum' ] = values.sum() if cell is None else cell[ 'sum' ][ measure ]
+            summary[ measure + '_mean' ] = summary[ measure + '_sum' ] / n if n else np.nan
+            summary[ measure + '_median' ] = ( ( values[ ( n - 1 ) // 2 ] + values[ n // 2 ] ) / 2 ) if n else np.nan
+        return( summary )
+
+    def to_frame( self ):
+        """Every cell as one row, indexed by ( area, month, outcome )."""
+        keys = sorted( self.cells )
+        frame = pd.DataFrame( [ self.query( *key ) for key in keys ] )
+        frame.index = pd.MultiIndex.from_tuples( keys, names = [ 'area', 'month', 'outcome' ] )
+        return( frame )
+
+
+def from_store( scenario = 'baseline', run = 'latest', path = constants.RESULTS_STORE ):
+    return( Rollup( store.read_results( [ 'Date', 'State' ] + MEASURES, scenario, run, path ) ) )
+
+
+# --- END --- #
@@ -0,0 +1,133 @@
+#
+# scenarios.py
+#
+# Run the rally analysis for a grid of settings without copying the
+# notebook per variant.
+#
+# The cube is loaded once and written as one .npy file per repair
+# strategy in the grid. Worker processes open those files as read-only
+# memmaps, so every scenario reads the same pages from the OS cache and
+# nothing of the county x day matrix is pickled or copied per worker.
+#
+#     grid = scenarios.grid( interval = [ 21, 42 ], normalize = [ False, True ] )
+#     results = scenarios.run_scenarios( grid )
+#
+import itertools
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import constants
+import events as event_list
+import load
+import outcome
+import quality
+import rates
+import resolve
+import transform
+import window
+
+DEFAULTS = {
+    'interval': constants.TIME_INTERVAL,
+    'metric': 'deaths',
+    'normalize': False,
+    'radius': 0.0,
+    'repair': 'flag',
+}
+
+# Cubes opened by each worker, keyed by repair strategy.
+_worker_cubes = {}
+_worker_events = None
+
+
+def grid( **options ):
+    """Every combination of the given settings, the rest at DEFAULTS."""
+    unknown = set( options ) - set( DEFAULTS )
+    if unknown:
+        raise ValueError( "unknown scenario settings: {0}".format( ', '.join( sorted( unknown ) ) ) )
+    names = list( DEFAULTS )
+    values = [ options.get( name, [ DEFAULTS[ name ] ] ) for name in names ]
+    return( [ dict( zip( names, combination ) ) for combination in itertools.product( *values ) ] )
+
+
+def run_scenario( cube, events, interval, metric, normalize, radius, repair = None ):
+    """prior/after/percent_change per event for one setting.
+
+    With a radius the windows are pooled over every county within that
+    many km of the event county. With normalize, pooled counts are per
+    100k residents of the pooled counties. Raw counts also get the Poisson
+    rate ratio columns. `repair` is informational; pass a cube that has
+    already been repaired.
+    """
+    event, rows = event_list.within_radius( cube, events[ 'Combined_Key' ], radius )
+    pairs = pd.DataFrame( { 'Date': events[ 'Date' ].values[ event ], 'Combined_Key': cube.keys[ rows ] } )
+    sums = window.rally_windows( cube, pairs, interval )
+    sums = sums[ [ metric + '_prior', metric + '_after' ] ].set_axis( [ 'deaths_prior', 'deaths_after' ], axis = 1 )
+    sums[ 'Population' ] = cube.meta[ 'Population' ].to_numpy( dtype = float )[ rows ]
+    pooled = sums.groupby( event ).sum().reindex( range( len( events ) ), fill_value = 0.0 )
+
+    if normalize:
+        population = pooled.pop( 'Population' ).where( lambda p: p > 0 )
+        pooled = pooled.mul( transform.PER_CAPITA / population, axis = 0 )
+    else:
+        pooled = pooled.drop( columns = 'Population' )
+
+    result = pd.DataFrame( {
+        'event': np.arange( len( events ) ),
+        'Date': events[ 'Date' ].values,
+        'Combined_Key': events[ 'Combined_Key' ].values,
+        'prior': pooled[ 'deaths_prior' ].values,
+        'after': pooled[ 'deaths_after' ].values,
+    } )
+    result[ 'percent_change' ] = outcome.percent_change( result[ 'prior' ], result[ 'after' ] )
+    if not normalize:
+        prior_days, after_days = window.window_days( cube, events, interval )
+        result = result.join( rates.rate_ratio( result[ 'prior' ], result[ 'after' ], prior_days, after_days,
+                                                index = result.index ) )
+    return( result )
+
+
+def _open_worker( paths, events ):
+    global _worker_events
+    _worker_events = events
+    for repair, path in paths.items():
+        _worker_cubes[ repair ] = load.open_cube( path, mmap_mode = 'r' )
+
+
+def _run_worker( scenario ):
+    return( run_scenario( _worker_cubes[ scenario[ 'repair' ] ], _worker_events, **scenario ) )
+
+
+def run_scenarios( scenarios, events = None, cube = None, workers = None, directory = None ):
+    """One tidy table: every event under every scenario, keyed by `scenario`."""
+    if cube is None:
+        cube = load.load_cube()
+    if events is None:
+        events = resolve.resolve( load.load_rallies() )
+    events = events[ [ 'Date', 'Combined_Key' ] ].reset_index( drop = True )
+
+    with tempfile.TemporaryDirectory( dir = directory ) as scratch:
+        paths = {}
+        for repair in sorted( set( s[ 'repair' ] for s in scenarios ) ):
+            paths[ repair ] = os.path.join( scratch, repair )
+            load.save_cube( quality.repaired_cube( cube, repair ), paths[ repair ] )
+
+        if workers == 1:
+            _open_worker( paths, events )
+            results = [ _run_worker( s ) for s in scenarios ]
+            _worker_cubes.clear()
+        else:
+            with ProcessPoolExecutor( workers, initializer = _open_worker, initargs = ( paths, events ) ) as pool:
+                results = list( pool.map( _run_worker, scenarios ) )
+
+    frames = []
+    for number, ( scenario, result ) in enumerate( zip( scenarios, results ) ):
+        settings = pd.DataFrame( { name: [ value ] * len( result ) for name, value in scenario.items() } )
+        frames.append( pd.concat( [ pd.DataFrame( { 'scenario': [ number ] * len( result ) } ), settings, result ], axis = 1 ) )
+    return( pd.concat( frames, ignore_index = True ) )
+
+
+# --- END --- #
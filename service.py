@@ -0,0 +1,242 @@
+#
+# service.py
+#
+# A small local HTTP/JSON service over the county x day cube, so
+# questions like "deaths in county X between dates A and B" do not need a
+# notebook rerun.
+#
+#     python3 service.py [--port 8512] [--cube data/cube]
+#
+# POST /query with a JSON body { "queries": [ ... ] }. Each query names a
+# county ( "county": Combined_Key, or "fips": code ), an optional
+# "metric" ( default "deaths" ) and either
+#
+#   "start" and "end"        the sum of daily counts over [ start, end ]
+#   "date" and "interval"    the rally windows: prior, after and
+#                            percent_change, as in the pipeline
+#
+# Answers come back in order as { "results": [ ... ] }, with per-100k
+# values alongside the counts. GET /health reports the cube and cache.
+#
+# Queries in a batch are answered together with the vectorized window
+# engine, and answers are kept in an LRU cache. Everything is local; the
+# server binds to 127.0.0.1 unless told otherwise.
+#
+import argparse
+import datetime
+import json
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+import constants
+import events as event_list
+import load
+import outcome
+import transform
+import window
+
+PORT = 8512
+CACHE_SIZE = 100000
+
+
+class QueryError( ValueError ):
+    pass
+
+
+def _iso( date ):
+    # Raises ValueError for anything that is not an ISO date string.
+    if not isinstance( date, str ):
+        raise QueryError( "dates must be ISO strings, not {0!r}".format( date ) )
+    return( datetime.date.fromisoformat( date ).isoformat() )
+
+
+def _number( value ):
+    return( None if value is None or not np.isfinite( value ) else float( value ) )
+
+
+class QueryEngine:
+    """Batched window queries over one resident cube, with an LRU cache."""
+
+    def __init__( self, cube, cache_size = CACHE_SIZE ):
+        self.cube = cube
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.days = cube.day_numbers()
+        self.span = int( ( self.days[ -1 ] - self.days[ 0 ] ) / np.timedelta64( 1, 'D' ) )
+        # Build both transforms now rather than on the first request.
+        self.counts = transform.transform( cube, 'cumulative' )
+        self.rates = transform.transform( cube, 'cumulative', normalize = True )
+
+    def _key( self, query ):
+        if not isinstance( query, dict ):
+            raise QueryError( "a query must be a JSON object, not {0!r}".format( query ) )
+        county = query.get( 'county' )
+        if county is None and query.get( 'fips' ) is not None:
+            county = event_list.fips_keys( self.cube, [ query[ 'fips' ] ] )[ 0 ]
+        if county is None or county not in self.cube.keys:
+            raise QueryError( "unknown county: {0!r}".format( query.get( 'county', query.get( 'fips' ) ) ) )
+        metric = query.get( 'metric', 'deaths' )
+        if metric not in self.cube.metrics:
+            raise QueryError( "unknown metric: {0!r}".format( metric ) )
+        if 'start' in query and 'end' in query:
+            start, end = self._date( query[ 'start' ] ), self._date( query[ 'end' ] )
+            if start > end:
+                raise QueryError( "start {0} is after end {1}".format( start, end ) )
+            return( ( 'range', county, metric, start, end ) )
+        if 'date' in query:
+            return( ( 'window', county, metric, self._date( query[ 'date' ] ), self._interval( query ) ) )
+        raise QueryError( "a query needs start and end, or date" )
+
+    def _date( self, value ):
+        date = _iso( value )
+        if not self.days[ 0 ] <= np.datetime64( date ) <= self.days[ -1 ]:
+            raise QueryError( "date {0} is outside the data, {1} to {2}".format( date, self.days[ 0 ], self.days[ -1 ] ) )
+        return( date )
+
+    def _interval( self, query ):
+        interval = query.get( 'interval', constants.TIME_INTERVAL )
+        if isinstance( interval, bool ) or not isinstance( interval, int ) or not 0 < interval <= self.span:
+            raise QueryError( "interval must be a whole number of days from 1 to {0}, not {1!r}".format( self.span, interval ) )
+        return( interval )
+
+    def _ranges( self, keys ):
+        rows = self.cube.keys.get_indexer( [ k[ 1 ] for k in keys ] )
+        metrics = np.array( [ self.cube.metrics.index( k[ 2 ] ) for k in keys ] )
+        start = np.array( [ k[ 3 ] for k in keys ], dtype = 'datetime64[D]' )
+        end = np.array( [ k[ 4 ] for k in keys ], dtype = 'datetime64[D]' )
+        first, last = window.window_bounds( self.days, start, end )
+        totals = window.window_sums( self.counts, rows, first, last )[ metrics, np.arange( len( keys ) ) ]
+        per_capita = window.window_sums( self.rates, rows, first, last )[ metrics, np.arange( len( keys ) ) ]
+        return( [ { 'county': k[ 1 ], 'metric': k[ 2 ], 'start': k[ 3 ], 'end': k[ 4 ],
+                    'sum': _number( t ), 'per_100k': _number( p ) } for k, t, p in zip( keys, totals, per_capita ) ] )
+
+    def _windows( self, keys ):
+        answers = [ None ] * len( keys )
+        for interval in sorted( set( k[ 4 ] for k in keys ) ):
+            batch = [ i for i, k in enumerate( keys ) if k[ 4 ] == interval ]
+            events = pd.DataFrame( { 'Combined_Key': [ keys[ i ][ 1 ] for i in batch ],
+                                     'Date': [ keys[ i ][ 3 ] for i in batch ] } )
+            counts = window.rally_windows( self.cube, events, interval )
+            rates = window.rally_windows( self.cube, events, interval, normalize = True )
+            metric = [ keys[ i ][ 2 ] for i in batch ]
+            columns = { name: np.choose( [ self.cube.metrics.index( m ) for m in metric ],
+                                         [ frame[ m + '_' + side ].to_numpy() for m in self.cube.metrics ] )
+                        for name, frame, side in ( ( 'prior', counts, 'prior' ), ( 'after', counts, 'after' ),
+                                                   ( 'prior_per_100k', rates, 'prior' ), ( 'after_per_100k', rates, 'after' ) ) }
+            columns[ 'percent_change' ] = outcome.percent_change( columns[ 'prior' ], columns[ 'after' ] )
+            for j, i in enumerate( batch ):
+                answers[ i ] = { 'county': keys[ i ][ 1 ], 'metric': metric[ j ], 'date': keys[ i ][ 3 ], 'interval': interval }
+                answers[ i ].update( ( name, _number( values[ j ] ) ) for name, values in columns.items() )
+        return( answers )
+
+    def query( self, queries ):
+        """Answers for a list of query dicts, in order; errors are reported per query."""
+        keys, results = [], [ None ] * len( queries )
+        for i, query in enumerate( queries ):
+            try:
+                keys.append( self._key( query ) )
+            except ( QueryError, ValueError, TypeError ) as error:
+                keys.append( None )
+                results[ i ] = { 'error': str( error ) }
+
+        with self.lock:
+            missing = []
+            for i, key in enumerate( keys ):
+                if key is None:
+                    continue
+                if key in self.cache:
+                    self.cache.move_to_end( key )
+                    results[ i ] = self.cache[ key ]
+                    self.hits += 1
+                else:
+                    missing.append( i )
+                    self.misses += 1
+
+        for kind, answer in ( ( 'range', self._ranges ), ( 'window', self._windows ) ):
+            todo = [ i for i in missing if keys[ i ][ 0 ] == kind ]
+            if todo:
+                for i, result in zip( todo, answer( [ keys[ i ] for i in todo ] ) ):
+                    results[ i ] = result
+
+        with self.lock:
+            for i in missing:
+                self.cache[ keys[ i ] ] = results[ i ]
+            while len( self.cache ) > self.cache_size:
+                self.cache.popitem( last = False )
+        return( results )
+
+    def health( self ):
+        return( { 'cube': repr( self.cube ), 'cached': len( self.cache ), 'hits': self.hits, 'misses': self.misses } )
+
+
+class Handler( BaseHTTPRequestHandler ):
+    engine = None
+
+    def _reply( self, status, body ):
+        data = json.dumps( body ).encode( 'utf-8' )
+        self.send_response( status )
+        self.send_header( 'Content-Type', 'application/json' )
+        self.send_header( 'Content-Length', str( len( data ) ) )
+        self.end_headers()
+        self.wfile.write( data )
+
+    def do_GET( self ):
+        if self.path == '/health':
+            self._reply( 200, self.engine.health() )
+        else:
+            self._reply( 404, { 'error': 'not found' } )
+
+    def do_POST( self ):
+        if self.path != '/query':
+            self._reply( 404, { 'error': 'not found' } )
+            return
+        try:
+            body = json.loads( self.rfile.read( int( self.headers.get( 'Content-Length', 0 ) ) ) )
+            queries = body[ 'queries' ]
+            if not isinstance( queries, list ):
+                raise TypeError( queries )
+        except ( ValueError, KeyError, TypeError ):
+            self._reply( 400, { 'error': 'expected a JSON body with a "queries" list' } )
+            return
+        self._reply( 200, { 'results': self.engine.query( queries ) } )
+
+    def log_message( self, format, *args ):
+        pass
+
+
+def make_server( cube, host = '127.0.0.1', port = PORT, cache_size = CACHE_SIZE ):
+    handler = type( 'BoundHandler', ( Handler, ), { 'engine': QueryEngine( cube, cache_size ) } )
+    return( ThreadingHTTPServer( ( host, port ), handler ) )
+
+
+def main( argv = None ):
+    parser = argparse.ArgumentParser( description = "Local query service over the county x day cube." )
+    parser.add_argument( '--host', default = '127.0.0.1' )
+    parser.add_argument( '--port', type = int, default = PORT )
+    parser.add_argument( '--cube', default = constants.CUBE_DIR,
+                         help = "saved cube to memory-map; the JHU CSVs are read if it does not exist" )
+    parser.add_argument( '--cache-size', type = int, default = CACHE_SIZE )
+    args = parser.parse_args( argv )
+
+    cube = load.open_cube( args.cube ) if os.path.exists( args.cube ) else load.load_cube()
+    server = make_server( cube, args.host, args.port, args.cache_size )
+    print( "Serving {0} on http://{1}:{2}".format( cube, *server.server_address ) )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
+
+
+# --- END --- #
@@ -0,0 +1,120 @@
+#
+# store.py
+#
+# One columnar results store in place of the overlapping CSV outputs.
+#
+# Every run of the pipeline writes the augmented rally table once, as a
+# Parquet dataset partitioned by scenario and run, with typed columns:
+# dates as dates, FIPS as integers, counts and percentages as floats.
+# The three CSVs the notebook used to write are projections of it, and
+# readers ask for just the columns they use.
+#
+# Parquet support comes from pyarrow, which is only needed here.
+#
+import os
+import shutil
+
+import pandas as pd
+
+import compute
+import constants
+
+PARTITIONS = [ 'scenario', 'run' ]
+
+SCHEMA = {
+    'Id': 'int64',
+    'Date': 'datetime64[s]',
+    'City': 'string',
+    'State': 'string',
+    'County': 'string',
+    'Combined_Key': 'string',
+    'FIPS': 'Int64',
+    'Lat': 'float64',
+    'Long_': 'float64',
+    'Population': 'float64',
+    'percent_change': 'float64',
+}
+
+LOCATION_COLUMNS = [ 'City', 'Lat', 'Long_', 'percent_change' ]
+TIME_SERIES_COLUMNS = [ 'Date', 'City', 'State', 'County', 'Combined_Key', 'percent_change' ]
+
+
+def partition_path( path, scenario, run ):
+    return( os.path.join( path, 'scenario={0}'.format( scenario ), 'run={0}'.format( run ) ) )
+
+
+def typed( frame ):
+    """Cast known columns to their store types; window sums stay float64."""
+    frame = frame.copy()
+    for column, dtype in SCHEMA.items():
+        if column in frame:
+            frame[ column ] = frame[ column ].astype( dtype )
+    for column in frame.columns:
+        if column.endswith( ( '_prior', '_after' ) ):
+            frame[ column ] = frame[ column ].astype( 'float64' )
+    return( frame )
+
+
+def write_results( augmented, scenario = 'baseline', run = 'latest', path = constants.RESULTS_STORE ):
+    """Replace the ( scenario, run ) partition with `augmented`."""
+    shutil.rmtree( partition_path( path, scenario, run ), ignore_errors = True )
+    frame = typed( augmented.rename_axis( 'Id' ).reset_index() )
+    frame[ 'scenario' ] = scenario
+    frame[ 'run' ] = run
+    frame.to_parquet( path, partition_cols = PARTITIONS, index = False, basename_template = 'part-{i}.parquet' )
+
+
+def read_results( columns = None, scenario = 'baseline', run = 'latest', path = constants.RESULTS_STORE ):
+    """Rows of one ( scenario, run ), or of all of them when both are None,
+    indexed by Id. Only `columns` are read from disk.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    filters = [ ( name, '==', str( value ) ) for name, value in zip( PARTITIONS, ( scenario, run ) ) if value is not None ]
+    wanted = None if columns is None else [ 'Id' ] + [ c for c in columns if c != 'Id' ]
+    # Read partition values as strings; left to inference, a store whose
+    # runs all look like numbers ( run=2024 ) gets integer partitions.
+    partitioning = ds.partitioning( pa.schema( [ ( name, pa.string() ) for name in PARTITIONS ] ), flavor = 'hive' )
+    frame = pd.read_parquet( path, columns = wanted, filters = filters or None, partitioning = partitioning )
+    for name in PARTITIONS:
+        if name in frame:
+            frame[ name ] = frame[ name ].astype( str )
+    return( frame.set_index( 'Id' ) )
+
+
+def _as_text( frame ):
+    """Undo the store types for the CSV projections: ISO date strings,
+    plain object columns."""
+    frame = frame.copy()
+    if 'Date' in frame:
+        frame[ 'Date' ] = frame[ 'Date' ].dt.strftime( '%Y-%m-%d' )
+    return( frame.astype( { c: object for c in frame.columns if frame[ c ].dtype == 'string' } ) )
+
+
+def augmented_csv( scenario = 'baseline', run = 'latest', path = constants.RESULTS_STORE,
+                   output = constants.AUGMENTED_FILE ):
+    frame = read_results( None, scenario, run, path ).drop( columns = PARTITIONS + [ 'FIPS' ], errors = 'ignore' )
+    _as_text( frame ).to_csv( output, index_label = 'Id' )
+
+
+def locations_csv( scenario = 'baseline', run = 'latest', path = constants.RESULTS_STORE,
+                   output = constants.LOCATIONS_FILE ):
+    frame = read_results( LOCATION_COLUMNS, scenario, run, path )
+    compute.locations( _as_text( frame ) ).to_csv( output, index_label = 'Id' )
+
+
+def time_series_csv( scenario = 'baseline', run = 'latest', path = constants.RESULTS_STORE,
+                     output = constants.TIME_SERIES_FILE ):
+    frame = read_results( TIME_SERIES_COLUMNS, scenario, run, path )
+    compute.time_series( _as_text( frame ) ).rename_axis( None ).to_csv( output )
+
+
+def export_csvs( scenario = 'baseline', run = 'latest', path = constants.RESULTS_STORE ):
+    """Write the three legacy CSVs from the store."""
+    augmented_csv( scenario, run, path )
+    locations_csv( scenario, run, path )
+    time_series_csv( scenario, run, path )
+
+
+# --- END --- #
@@ -0,0 +1,80 @@
+#
+# transform.py
+#
+# Daily counts, N-day moving averages and per-100k rates for the whole
+# cube at once. Results are cached on the cube by their parameters, so the
+# window engine and the plots share one copy of each transform.
+#
+import numpy as np
+
+KINDS = ( 'cumulative', 'daily', 'average' )
+
+PER_CAPITA = 100000
+
+
+def daily( cumulative ):
+    """Daily counts along the last axis; day 0 is NaN, as with `diff()`."""
+    counts = np.empty_like( cumulative, dtype = float )
+    counts[ ..., 0 ] = np.nan
+    np.subtract( cumulative[ ..., 1: ], cumulative[ ..., :-1 ], out = counts[ ..., 1: ] )
+    return( counts )
+
+
+def moving_average( cumulative, days = 7 ):
+    """Trailing `days`-day mean of daily counts.
+
+    The cumulative series already is the running sum of daily counts, so
+    the window sum is one subtraction. The first `days` entries are NaN.
+    """
+    average = np.full( cumulative.shape, np.nan )
+    if days < cumulative.shape[ -1 ]:
+        average[ ..., days: ] = ( cumulative[ ..., days: ] - cumulative[ ..., :-days ] ) / days
+    return( average )
+
+
+def per_capita( values, population, per = PER_CAPITA ):
+    """Scale county rows of `values` to a rate per `per` residents.
+
+    Counties without a usable population (the JHU "Unassigned" and
+    "Out of" rows carry 0) become NaN.
+    """
+    population = np.asarray( population, dtype = float )
+    scale = np.full( population.shape, np.nan )
+    np.divide( per, population, out = scale, where = population > 0 )
+    return( values * scale[ :, np.newaxis ] )
+
+
+def transform( cube, kind = 'daily', days = 7, normalize = False ):
+    """Cached ( metric, county, day ) array for one set of parameters.
+
+    kind is 'cumulative', 'daily' or 'average' ( `days`-day moving average );
+    normalize scales to counts per 100k residents. The returned array is
+    read-only because it is shared between callers.
+    """
+    if kind not in KINDS:
+        raise ValueError( "kind must be one of {0}, not {1!r}".format( KINDS, kind ) )
+
+    key = ( kind, days if kind == 'average' else None, bool( normalize ) )
+    if key in cube.transforms:
+        return( cube.transforms[ key ] )
+
+    if normalize:
+        values = per_capita( transform( cube, kind, days ), cube.meta[ 'Population' ] )
+    elif kind == 'cumulative':
+        values = np.asarray( cube.values, dtype = float )
+    elif kind == 'daily':
+        values = daily( cube.values )
+    else:
+        values = moving_average( cube.values, days )
+
+    if values is not cube.values:
+        values.flags.writeable = False
+    cube.transforms[ key ] = values
+    return( values )
+
+
+def clear_cache( cube ):
+    cube.transforms.clear()
+
+
+# --- END --- #
@@ -0,0 +1,123 @@
+#
+# window.py
+#
+# Before/after window sums for every rally and every metric in one pass.
+#
+# The notebook sums daily counts, `diff()` of the cumulative series, over
+# the label slices [rally - interval, rally] and [rally, rally + interval].
+# A sum of daily differences telescopes, so each window is a difference of
+# two cumulative values and the whole computation is two fancy-index
+# lookups into the cube.
+#
+import numpy as np
+import pandas as pd
+
+import constants
+import transform
+
+
+def window_bounds( days, start, end ):
+    """Positions of the first and last day inside each [start, end] label slice."""
+    first = np.searchsorted( days, start, side = 'left' )
+    last = np.searchsorted( days, end, side = 'right' ) - 1
+    return( first, last )
+
+
+def window_sums( values, rows, first, last ):
+    """Sum of daily counts over positions first..last of each row.
+
+    `values` is ( metric, county, day ) cumulative counts. Day 0 has no
+    daily count (its diff is NaN and `sum()` skips it), so a window that
+    starts there telescopes to values[ last ] - values[ 0 ]. Empty windows
+    sum to 0, as they do in pandas.
+    """
+    lo = np.maximum( first - 1, 0 )
+    hi = np.maximum( last, lo )
+    sums = values[ :, rows, hi ] - values[ :, rows, lo ]
+    return( np.where( hi > lo, sums, 0.0 ) )
+
+
+def event_positions( cube, events ):
+    """Row of each event's Combined_Key in the cube, -1 when it has no match."""
+    return( cube.keys.get_indexer( events[ 'Combined_Key' ] ) )
+
+
+def event_days( events ):
+    return( np.array( events[ 'Date' ], dtype = 'datetime64[D]' ) )
+
+
+def event_starts( cube, events ):
+    """Day position of each event's Date in the cube, -1 when the date is
+    missing or outside the data."""
+    days = cube.day_numbers()
+    rally = event_days( events )
+    start = np.minimum( np.searchsorted( days, rally ), len( days ) - 1 )
+    return( np.where( days[ start ] == rally, start, -1 ) )
+
+
+def rally_windows( cube, events, interval = constants.TIME_INTERVAL, normalize = False, after = None ):
+    """`<metric>_prior` and `<metric>_after` columns for every event.
+
+    `events` needs `Date` (ISO) and `Combined_Key` columns. Events whose
+    county is not in the cube sum to 0, as their all-NaN columns did in
+    the notebook. With normalize the sums are per 100k residents. The
+    window after the rally is `after` days long, `interval` by default.
+    """
+    values = transform.transform( cube, 'cumulative', normalize = normalize )
+    days = cube.day_numbers()
+    rally = event_days( events )
+    span = np.timedelta64( interval, 'D' )
+    span_after = span if after is None else np.timedelta64( after, 'D' )
+
+    rows = event_positions( cube, events )
+    found = rows >= 0
+    rows = np.where( found, rows, 0 )
+
+    prior_sums = window_sums( values, rows, *window_bounds( days, rally - span, rally ) )
+    after_sums = window_sums( values, rows, *window_bounds( days, rally, rally + span_after ) )
+
+    columns = {}
+    for m, metric in enumerate( cube.metrics ):
+        columns[ metric + '_prior' ] = np.where( found, prior_sums[ m ], 0.0 )
+        columns[ metric + '_after' ] = np.where( found, after_sums[ m ], 0.0 )
+    return( pd.DataFrame( columns, index = events.index ) )
+
+
+def window_days( cube, events, interval = constants.TIME_INTERVAL, after = None ):
+    """Number of daily counts in each event's prior and after window.
+
+    Windows are shorter than interval + 1 days where they run off either
+    end of the data, which matters when comparing their rates.
+    """
+    days = cube.day_numbers()
+    rally = event_days( events )
+    span = np.timedelta64( interval, 'D' )
+    span_after = span if after is None else np.timedelta64( after, 'D' )
+
+    lengths = []
+    for start, end in ( ( rally - span, rally ), ( rally, rally + span_after ) ):
+        first, last = window_bounds( days, start, end )
+        lo = np.maximum( first - 1, 0 )
+        lengths.append( np.maximum( last, lo ) - lo )
+    return( lengths[ 0 ], lengths[ 1 ] )
+
+
+def event_series( cube, events, metric = 'deaths', interval = constants.TIME_INTERVAL,
+                  kind = 'average', days = 7, normalize = False ):
+    """One row per event of a transformed series from rally - interval to
+    rally + interval, columns labelled by day offset. Days outside the
+    data, and events without a county or dated outside the data, are NaN.
+    """
+    values = transform.transform( cube, kind, days, normalize )[ cube.metrics.index( metric ) ]
+    offsets = np.arange( -interval, interval + 1 )
+
+    start = event_starts( cube, events )
+    positions = start[ :, np.newaxis ] + offsets
+    rows = event_positions( cube, events )
+    valid = ( ( rows >= 0 ) & ( start >= 0 ) )[ :, np.newaxis ] & ( positions >= 0 ) & ( positions < values.shape[ -1 ] )
+
+    series = values[ np.maximum( rows, 0 )[ :, np.newaxis ], np.clip( positions, 0, values.shape[ -1 ] - 1 ) ]
+    return( pd.DataFrame( np.where( valid, series, np.nan ), index = events.index, columns = offsets ) )
+
+
+# --- END --- #